@@ -0,0 +1,366 @@
+"""
+Benchmark de carga de ponta a ponta: popula o banco com dados sintéticos, dispara
+requisições HTTP concorrentes contra a aplicação e relata, por rota, os percentis de
+latência e as requisições por segundo, comparando com um baseline salvo.
+
+Uso (a partir da raiz do repositório, com o pacote instalado via `make venv`):
+
+    python benchmarks/load.py --database postgresql:///facilitai_bench --reset
+    python benchmarks/load.py --database postgresql:///facilitai_bench --save-baseline
+    python benchmarks/load.py --url http://localhost:8000 --database postgresql:///facilitai
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from werkzeug.serving import make_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed import seed, PASSWORD, GENEROS
+
+from main.main import create_app
+from models.model import db, User, AnuncioLivro, AnuncioApartamento, Imagem
+from models.migrations import migrate
+from conf.config import LOGIN, SEARCH_BOOKS, SEARCH_APARTMENTS, FAV_AD, GET_FAV_ADS, IMAGE
+
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+# peso de cada operação no cenário de cada usuário virtual
+SCENARIO = {
+    'search_books': 35,
+    'search_apartments': 20,
+    'fav_ad': 10,
+    'get_fav_ads': 10,
+    'image': 20,
+    'login': 5
+}
+
+
+class Client:
+    """
+    Cliente HTTP de um usuário virtual, com conexão persistente (keep-alive).
+    """
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.token = None
+        self._connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        if self.token: headers['Authorization'] = f'Bearer {self.token}'
+
+        for attempt in (1, 2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                data = response.read()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                # o servidor fechou a conexão persistente: reabre uma vez
+                self._connection.close()
+                self._connection = None
+
+                if attempt == 2: raise
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok: self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def percentile(values, fraction):
+    """
+    Percentil pelo método do posto mais próximo; `values` deve estar ordenada.
+    """
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+class VirtualUser:
+    """
+    Executa o cenário de um usuário: login e depois operações sorteadas conforme SCENARIO.
+    """
+
+    def __init__(self, base_url, data, recorder, rng):
+        self.client = Client(base_url)
+        self.data = data
+        self.recorder = recorder
+        self.rng = rng
+        self.username = rng.choice(data['usernames'])
+
+    def call(self, route, method, path, body=None, expected=(200,), headers=None):
+        start = time.perf_counter()
+
+        try:
+            status, data = self.client.request(method, path, body, headers)
+        except (OSError, http.client.HTTPException):
+            status, data = None, b''
+
+        if self.recorder is not None:
+            self.recorder.record(route, time.perf_counter() - start, status in expected)
+
+        return status, data
+
+    def login(self):
+        self.client.token = None
+        status, data = self.call('login', 'POST', LOGIN, {'username': self.username, 'password': PASSWORD})
+        if status == 200: self.client.token = json.loads(data)['access_token']
+
+    def search_books(self):
+        filters = {'limit': self.rng.choice((10, 20, 50))}
+
+        if self.rng.random() < 0.5: filters['genero'] = self.rng.choice(GENEROS)
+        if self.rng.random() < 0.3: filters['preco_max'] = self.rng.choice((20, 50, 100, 200))
+
+        self.call('search_books', 'POST', SEARCH_BOOKS, filters)
+
+    def search_apartments(self):
+        filters = {'limit': self.rng.choice((10, 20, 50))}
+
+        if self.rng.random() < 0.5: filters['num_comodos'] = self.rng.randint(1, 4)
+        if self.rng.random() < 0.3: filters['valor_max'] = self.rng.choice((50, 100, 500))
+
+        self.call('search_apartments', 'POST', SEARCH_APARTMENTS, filters)
+
+    def fav_ad(self):
+        anuncio_id = self.rng.choice(self.data['book_ids'] + self.data['apartment_ids'])
+
+        # 400 indica um anúncio que o usuário já tinha favoritado
+        self.call('fav_ad', 'POST', FAV_AD, {'anuncio_id': anuncio_id}, expected=(200, 400))
+
+    def get_fav_ads(self):
+        self.call('get_fav_ads', 'GET', GET_FAV_ADS)
+
+    def image(self):
+        if not self.data['images']: return
+
+        name = self.rng.choice(self.data['images'])
+        self.call('image', 'GET', IMAGE.replace('<file_name>', name), expected=(200, 304))
+
+    def run(self, stop):
+        self.login()
+
+        operations = list(SCENARIO)
+        weights = list(SCENARIO.values())
+
+        while not stop.is_set():
+            getattr(self, self.rng.choices(operations, weights)[0])()
+
+
+def load_data(args):
+    """
+    Popula o banco (ou reaproveita os dados de um benchmark anterior) e devolve os
+    identificadores usados pelos usuários virtuais.
+    """
+    if args.reset: db.drop_all()
+
+    migrate()
+
+    if User.query.filter(User.username.like('bench.%')).first() is None:
+        print(f'Populando o banco: {args.users} usuários, {args.ads} anúncios, {args.favorites} favoritos, {args.images} imagens...')
+        start = time.perf_counter()
+        data = seed(args.users, args.ads, args.favorites, args.images, args.seed)
+        print(f'Banco populado em {time.perf_counter() - start:.1f} s.')
+        return data
+
+    print('Reaproveitando os dados de um benchmark anterior (use --reset para recriar).')
+
+    return {
+        'usernames': [username for username, in db.session.query(User.username).filter(User.username.like('bench.%'))],
+        'book_ids': [anuncio_id for anuncio_id, in db.session.query(AnuncioLivro.id)],
+        'apartment_ids': [anuncio_id for anuncio_id, in db.session.query(AnuncioApartamento.id)],
+        'images': [nome for nome, in db.session.query(Imagem.nome)]
+    }
+
+
+def run_load(base_url, data, concurrency, duration, warmup, random_seed):
+    recorder = Recorder()
+    stop = threading.Event()
+    users = [VirtualUser(base_url, data, recorder, random.Random(random_seed + i)) for i in range(concurrency)]
+
+    # aquecimento sem registro: preenche caches e pools antes da medição
+    if warmup:
+        warmup_stop = threading.Event()
+        warmup_users = [VirtualUser(base_url, data, None, random.Random(-random_seed - i - 1)) for i in range(concurrency)]
+        threads = [threading.Thread(target=user.run, args=(warmup_stop,), daemon=True) for user in warmup_users]
+
+        for thread in threads: thread.start()
+        time.sleep(warmup)
+        warmup_stop.set()
+        for thread in threads: thread.join()
+
+    threads = [threading.Thread(target=user.run, args=(stop,), daemon=True) for user in users]
+    start = time.perf_counter()
+
+    for thread in threads: thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads: thread.join()
+
+    elapsed = time.perf_counter() - start
+
+    return summarize(recorder, elapsed)
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+
+    for route, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        routes[route] = {
+            'count': len(latencies),
+            'errors': recorder.errors.get(route, 0),
+            'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p90_ms': percentile(latencies, 0.90) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000
+        }
+
+    total = sum(route['count'] for route in routes.values())
+
+    return {'elapsed': elapsed, 'total_rps': total / elapsed if elapsed else 0, 'routes': routes}
+
+
+def print_report(results):
+    print(f'\n{"rota":<20}{"reqs":>8}{"erros":>7}{"req/s":>9}{"p50":>9}{"p90":>9}{"p95":>9}{"p99":>9}{"max":>9}  (ms)')
+
+    for route, stats in results['routes'].items():
+        print(f'{route:<20}{stats["count"]:>8}{stats["errors"]:>7}{stats["rps"]:>9.1f}'
+              f'{stats["p50_ms"]:>9.1f}{stats["p90_ms"]:>9.1f}{stats["p95_ms"]:>9.1f}{stats["p99_ms"]:>9.1f}{stats["max_ms"]:>9.1f}')
+
+    print(f'\nTotal: {results["total_rps"]:.1f} req/s em {results["elapsed"]:.1f} s')
+
+
+def error_rate(stats):
+    return stats.get('errors', 0) / stats['count'] if stats['count'] else 0
+
+
+def compare(results, baseline, threshold):
+    """
+    Compara os resultados com o baseline, rota a rota.
+
+    Returns:
+        A lista de regressões: p95 acima ou req/s abaixo do baseline por mais que
+        `threshold`, ou taxa de erros mais que `threshold` acima da do baseline.
+    """
+    regressions = []
+
+    print(f'\nComparação com o baseline (tolerância {threshold:.0%}):')
+
+    for route, stats in results['routes'].items():
+        base = baseline['routes'].get(route)
+        if base is None: continue
+
+        p95 = stats['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0
+        rps = stats['rps'] / base['rps'] - 1 if base['rps'] else 0
+        errors = error_rate(stats) - error_rate(base)
+        regressed = p95 > threshold or rps < -threshold or errors > threshold
+
+        print(f'{route:<20} p95 {p95:+7.1%}   req/s {rps:+7.1%}   erros {errors:+7.1%}{"   REGRESSÃO" if regressed else ""}')
+
+        if regressed: regressions.append(route)
+
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de carga do backend do Facilitaí.')
+    parser.add_argument('--database', default=os.getenv('FACILITAI_BENCH_DATABASE', 'postgresql:///facilitai_bench'), help='URI do banco a popular e usar.')
+    parser.add_argument('--url', default=None, help='URL de um servidor já em execução; sem ela, a aplicação sobe em uma thread local.')
+    parser.add_argument('--reset', action='store_true', help='Apaga e recria as tabelas antes de popular.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--ads', type=int, default=5000)
+    parser.add_argument('--favorites', type=int, default=2000)
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16, help='Quantidade de usuários virtuais simultâneos.')
+    parser.add_argument('--duration', type=float, default=30, help='Duração da medição, em segundos.')
+    parser.add_argument('--warmup', type=float, default=3, help='Aquecimento antes da medição, em segundos.')
+    parser.add_argument('--seed', type=int, default=0, help='Semente dos dados e do cenário.')
+    parser.add_argument('--image-path', default=None, help='Diretório das imagens (padrão: diretório temporário).')
+    parser.add_argument('--output', default=None, help='Arquivo JSON onde salvar os resultados.')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Arquivo JSON do baseline.')
+    parser.add_argument('--save-baseline', action='store_true', help='Salva os resultados como o novo baseline.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Variação tolerada em relação ao baseline.')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    image_path = args.image_path or tempfile.mkdtemp(prefix='facilitai-bench-')
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database, 'IMAGE_PATH': image_path})
+
+    with app.app_context():
+        data = load_data(args)
+
+    server = None
+    base_url = args.url
+
+    if base_url is None:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.port}'
+
+    print(f'Carga em {base_url}: {args.concurrency} usuários virtuais por {args.duration:.0f} s...')
+
+    try:
+        results = run_load(base_url, data, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        if server is not None: server.shutdown()
+
+    results['config'] = {key: getattr(args, key) for key in ('users', 'ads', 'favorites', 'images', 'concurrency', 'duration', 'seed')}
+    results['config']['database'] = app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]
+
+    print_report(results)
+
+    if args.output: Path(args.output).write_text(json.dumps(results, indent=2))
+
+    regressions = []
+    baseline = Path(args.baseline)
+
+    if args.save_baseline:
+        baseline.write_text(json.dumps(results, indent=2))
+        print(f'\nBaseline salvo em {baseline}.')
+    elif baseline.is_file():
+        regressions = compare(results, json.loads(baseline.read_text()), args.threshold)
+    else:
+        print(f'\nSem baseline em {baseline}; use --save-baseline para criar um.')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import hashlib
+import random
+import struct
+import zlib
+
+from collections import Counter
+from sqlalchemy import insert, select
+
+from models.model import db, User, Imagem
+from models.images import image_dir, image_file
+from models.seed import GENEROS as PESOS_GENEROS, load_synthetic_data
+
+
+# senha de todos os usuários do benchmark
+PASSWORD = 'benchmark-123'
+
+GENEROS = tuple(PESOS_GENEROS)
+
+
+def _png(seed, size=64):
+    """
+    PNG válido de `size` x `size` pixels com ruído, para servir como imagem dos anúncios.
+    """
+    rng = random.Random(seed)
+    rows = b''.join(b'\x00' + bytes(rng.getrandbits(8) for _ in range(size * 3)) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+def seed(users, ads, favorites, images, random_seed=0):
+    """
+    Popula o banco (já criado) com dados sintéticos para o benchmark, usando a mesma
+    carga em massa do comando `flask seed-data`. Deve ser chamada dentro de um app
+    context.
+
+    Returns:
+        Um dicionário com os nomes de usuário, os IDs dos anúncios de cada tipo e os
+        nomes das imagens criadas.
+    """
+    image_dir().mkdir(parents=True, exist_ok=True)
+    image_names = []
+
+    for i in range(images):
+        data = _png(random_seed * 1000 + i)
+        name = hashlib.sha256(data).hexdigest()
+        image_file(name).write_bytes(data)
+        image_names.append(name)
+
+    books = ads // 2
+    data = load_synthetic_data(users, books, ads - books, favorites, 0, random_seed=random_seed, password=PASSWORD,
+                               username_prefix='bench.', images=image_names)
+
+    if image_names:
+        references = Counter(image_names[anuncio_id % len(image_names)] for anuncio_id in data['book_ids'] + data['apartment_ids'])
+
+        db.session.execute(insert(Imagem), [{
+            'nome': name,
+            'mimetype': 'image/png',
+            'tamanho': image_file(name).stat().st_size,
+            'referencias': references[name]
+        } for name in image_names])
+
+        db.session.commit()
+
+    usernames = db.session.scalars(select(User.username).where(User.id.in_(data['user_ids']))).all()
+
+    return {'usernames': usernames, 'book_ids': data['book_ids'], 'apartment_ids': data['apartment_ids'], 'images': image_names}
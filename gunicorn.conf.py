@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+
+
+# configuração do gunicorn para produção, carregada automaticamente a partir da raiz
+# do repositório: gunicorn main.wsgi:app
+
+bind = os.getenv('FACILITAI_BIND', '0.0.0.0:8000')
+
+# um processo por núcleo (o hash de senhas já roda em processos à parte, dois por
+# worker com PASSWORD_HASH_WORKERS = 2) e threads por processo para esconder a espera
+# pelo banco; cada worker abre até DB_POOL_SIZE + DB_MAX_OVERFLOW conexões
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('FACILITAI_THREADS', 4))
+worker_class = 'gthread'
+
+# o app é importado uma vez no master e os workers o herdam por fork (copy-on-write),
+# o que reduz a memória e o tempo de subida de cada worker
+preload_app = True
+
+# reciclagem dos workers, com jitter para não reiniciarem todos juntos
+max_requests = int(os.getenv('FACILITAI_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.getenv('FACILITAI_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+
+
+def when_ready(server):
+    """
+    Avisa quando os workers podem abrir mais conexões do que o banco aceita.
+    """
+    from main.wsgi import app
+    from models.pool import max_connections
+    from conf.config import DB_MAX_CONNECTIONS
+
+    connections = max_connections(app.config, server.cfg.workers)
+    budget = app.config.get('DB_MAX_CONNECTIONS', DB_MAX_CONNECTIONS)
+
+    if connections is not None and connections > budget:
+        server.log.warning(
+            '%s workers podem abrir até %s conexões, acima de DB_MAX_CONNECTIONS (%s): reduza '
+            'WEB_CONCURRENCY, DB_POOL_SIZE ou DB_MAX_OVERFLOW, ou use DB_POOL_MODE = pgbouncer.',
+            server.cfg.workers, connections, budget
+        )
+
+
+def post_fork(server, worker):
+    """
+    Já no worker e antes de aceitar requests: descarta as conexões herdadas do master,
+    abre as do pool próprio, compila as consultas quentes e preenche os caches.
+    """
+    from main.wsgi import app
+    from main.warmup import warm_up
+
+    timings = warm_up(app)
+
+    server.log.info('Worker %s aquecido em %.2f s.', worker.pid, timings['warmup'])
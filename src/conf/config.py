@@ -7,6 +7,7 @@ REGISTER = '/register'
 LOGIN = '/login'
 LOGOUT = '/logout'
 CREATE_AD = '/create-ad'
+CREATE_ADS = '/create-ads'
 UPDATE = '/update'
 DELETE_AD = '/delete-ad'
 EDIT_AD = '/edit-ad'
@@ -15,11 +16,119 @@ UPLOAD_PROFILE_IMG= '/upload-profile'
 IMAGE = '/image/<file_name>'
 SEARCH_BOOKS = '/search-books'
 SEARCH_APARTMENTS = '/search-apartments'
+SEARCH_BOOKS_FACETS = '/search-books/facets'
+SEARCH_APARTMENTS_FACETS = '/search-apartments/facets'
 FAV_AD = '/fav-ad'
 GET_FAV_ADS = '/get-fav-ads'
+FAV_ADS = '/fav-ads'
+POOL_STATS = '/pool-stats'
+METRICS = '/metrics'
 
 # image saving paths
 IMAGE_PATH = '~/.facilitai/images/'
+IMAGE_CHUNK_SIZE = 64 * 1024
+IMAGE_MAX_SIZE = 5 * 1024 * 1024
+
+# cache das imagens servidas (segundos) e prefixo interno do nginx para X-Accel-Redirect
+IMAGE_MAX_AGE = 3600
+IMAGE_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+IMAGE_ACCEL_PREFIX = '/protected-images/'
+
+# paginação das buscas
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 500
+SEARCH_STREAM_BATCH = 100
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# quantidade padrão e máxima de faixas no histograma de preços das facetas
+FACET_PRICE_BUCKETS = 10
+FACET_MAX_PRICE_BUCKETS = 50
+
+# quantidade máxima de anúncios por operação em lote nos favoritos e na criação
+FAV_BULK_MAX = 500
+CREATE_ADS_MAX = 500
+
+# hash de senhas: método do werkzeug (algoritmo:hash:iterações) e processos do pool (0 calcula no request)
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:260000'
+PASSWORD_HASH_WORKERS = 2
+
+# cache das respostas de busca: backend (local, redis ou None), TTL em segundos e limites
+SEARCH_CACHE_BACKEND = 'local'
+SEARCH_CACHE_TTL = 30
+SEARCH_CACHE_SIZE = 1000
+SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SEARCH_CACHE_HEADER = 'X-Cache'
+
+# estratégias de carregamento do anunciante nas listagens: joined, selectin, subquery ou lazy
+ANUNCIANTE_LOADING = 'joined'
+
+# carregamento das colunas dos subtipos nas consultas pela classe base Anuncio: joined
+# (um único SELECT com as tabelas dos subtipos), selectin (um SELECT por subtipo) ou lazy
+ANUNCIO_POLYMORPHIC_LOADING = 'joined'
+
+# cache das consultas de autenticação (usuário do token e revogação), TTL em segundos
+JWT_CACHE_TTL = 30
+JWT_CACHE_SIZE = 10000
+
+# filtro de Bloom dos tokens revogados e limpeza dos tokens expirados (intervalos em segundos);
+# um logout feito em outro worker só é visto na sincronização seguinte, até
+# BLOCKLIST_SYNC_INTERVAL segundos depois; a margem faz cada sincronização reler as
+# revogações recentes, confirmadas fora de ordem
+BLOCKLIST_BLOOM_CAPACITY = 100000
+BLOCKLIST_BLOOM_ERROR_RATE = 0.01
+BLOCKLIST_SYNC_INTERVAL = 5
+BLOCKLIST_SYNC_MARGIN = 60
+BLOCKLIST_PURGE_INTERVAL = 3600
+
+# caixa de saída de emails (intervalos em segundos)
+MAIL_DEFAULT_SENDER = 'facilitai-ufcg@gmail.com'
+MAIL_BATCH_SIZE = 50
+MAIL_MAX_ATTEMPTS = 5
+MAIL_RETRY_BACKOFF = 30
+MAIL_WORKER_INTERVAL = 10
+MAIL_IDLE_TIMEOUT = 60
+
+# prazo (segundos) de um lote reservado por um worker antes de voltar à fila
+MAIL_CLAIM_TIMEOUT = 300
+
+# pool de conexões com o banco, por worker: `queue` (pool próprio) ou `pgbouncer`
+# (PgBouncer em transaction pooling); tamanho, overflow, timeout de espera (s),
+# reciclagem das conexões (s), teste da conexão no checkout e exposição das estatísticas
+# (desligada por padrão: a rota não tem autenticação)
+DB_POOL_MODE = 'queue'
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+
+# conexões que os workers de um nó podem abrir no banco (o max_connections padrão do
+# PostgreSQL é 100); o gunicorn avisa na subida se workers * (DB_POOL_SIZE +
+# DB_MAX_OVERFLOW) passar disso. Em produção, com vários nós, prefira `pgbouncer`
+DB_MAX_CONNECTIONS = 100
+POOL_STATS_ENABLED = False
+
+# exposição das métricas dos requests no formato do Prometheus (desligada por padrão:
+# a rota não tem autenticação)
+METRICS_ENABLED = False
+
+# compressão das respostas: codecs em ordem de preferência, nível padrão, nível das
+# buscas (comprimidas uma vez e guardadas no cache), tamanho mínimo e tipos comprimidos
+COMPRESS_ALGORITHMS = ('zstd', 'br', 'gzip')
+COMPRESS_LEVEL = 6
+COMPRESS_SEARCH_LEVEL = 9
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/plain')
+
+# prefixo das variáveis de ambiente lidas como configuração em produção (por exemplo,
+# FACILITAI_SECRET_KEY e FACILITAI_JWT_SECRET_KEY, os segredos compartilhados pelos workers)
+CONFIG_ENV_PREFIX = 'FACILITAI'
+
+# serialização das respostas com orjson, quando instalado
+FAST_JSON = True
+
+# headers de depuração
+QUERY_COUNT_HEADER = 'X-Query-Count'
 
 
 def initial_config():
@@ -0,0 +1,127 @@
+import gzip
+
+from flask import g, request
+
+from conf.config import (
+    COMPRESS_ALGORITHMS,
+    COMPRESS_LEVEL,
+    COMPRESS_MIN_SIZE,
+    COMPRESS_MIMETYPES
+)
+
+# dependências opcionais: sem elas o codec correspondente não é oferecido
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+_CODECS = {
+    'gzip': lambda data, level: gzip.compress(data, compresslevel=min(max(level, 1), 9), mtime=0),
+    'br': (lambda data, level: brotli.compress(data, quality=min(level, 11))) if brotli else None,
+    'zstd': (lambda data, level: zstandard.ZstdCompressor(level=min(level, 22)).compress(data)) if zstandard else None
+}
+
+
+def compression_level(level):
+    """
+    Define o nível de compressão das respostas de uma rota (0 desliga a compressão).
+    O nível é repassado ao codec negociado, limitado à faixa que ele aceita.
+    """
+
+    def decorator(view):
+        view.compression_level = level
+        return view
+
+    return decorator
+
+
+def compress(data, encoding, level):
+    return _CODECS[encoding](data, level)
+
+
+def negotiate(accept_encodings, algorithms):
+    """
+    Escolhe o codec de maior qualidade no Accept-Encoding do cliente; em caso de
+    empate, vale a ordem de preferência de `algorithms`.
+
+    Returns:
+        O nome do codec, ou None se o cliente não aceitar nenhum dos disponíveis.
+    """
+    best, best_quality = None, 0
+
+    for encoding in algorithms:
+        if _CODECS.get(encoding) is None: continue
+
+        quality = accept_encodings[encoding]
+
+        if quality > best_quality: best, best_quality = encoding, quality
+
+    return best
+
+
+def init_compression(app):
+    """
+    Comprime as respostas conforme o Accept-Encoding do cliente (zstd, br ou gzip).
+
+    Só são comprimidas as respostas com mimetype em COMPRESS_MIMETYPES (imagens e
+    arquivos ficam de fora) e com pelo menos COMPRESS_MIN_SIZE bytes. Respostas em
+    streaming passam sem compressão. Quando a resposta saiu do cache de buscas, a
+    versão comprimida também é guardada no cache, e as próximas requisições iguais
+    não comprimem de novo.
+    """
+    algorithms = app.config.get('COMPRESS_ALGORITHMS', COMPRESS_ALGORITHMS)
+    min_size = app.config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+    default_level = app.config.get('COMPRESS_LEVEL', COMPRESS_LEVEL)
+    mimetypes = app.config.get('COMPRESS_MIMETYPES', COMPRESS_MIMETYPES)
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in mimetypes: return response
+
+        response.vary.add('Accept-Encoding')
+
+        view = app.view_functions.get(request.endpoint)
+        level = getattr(view, 'compression_level', default_level)
+
+        if (not level
+                or response.status_code < 200 or response.status_code >= 300 or response.status_code == 204
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.content_length is not None and response.content_length < min_size):
+            return response
+
+        encoding = negotiate(request.accept_encodings, algorithms)
+        if encoding is None: return response
+
+        data = response.get_data()
+        if len(data) < min_size: return response
+
+        response.set_data(_compressed(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+
+        etag, weak = response.get_etag()
+        if etag: response.set_etag(f'{etag}-{encoding}', weak)
+
+        return response
+
+    def _compressed(data, encoding, level):
+        cache = app.extensions.get('facilitai_search_cache')
+        cache_key = g.get('search_cache_key', None)
+
+        if cache is None or cache_key is None: return compress(data, encoding, level)
+
+        key = f'{cache_key}#{encoding}:{level}'
+        cached = cache.get(key)
+
+        if cached is not None: return cached[0]
+
+        body = compress(data, encoding, level)
+        cache.set(key, (body, {}))
+
+        return body
@@ -0,0 +1,36 @@
+import time
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from conf.config import QUERY_COUNT_HEADER
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+        context.facilitai_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'facilitai_query_start', None)
+
+    if start is not None and has_app_context():
+        g.query_time = g.get('query_time', 0.0) + time.perf_counter() - start
+
+
+def init_debug(app):
+    """
+    Registra os headers de depuração. Com DEBUG_HEADERS ligado, toda resposta
+    informa em QUERY_COUNT_HEADER quantas consultas foram feitas ao banco no request.
+    """
+
+    @app.after_request
+    def query_count_header(response):
+        if app.config['DEBUG_HEADERS']:
+            response.headers[QUERY_COUNT_HEADER] = str(g.get('query_count', 0))
+
+        return response
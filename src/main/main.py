@@ -1,4 +1,5 @@
 import os
+import time
 
 from flask_cors import CORS
 from flask import Flask 
@@ -8,15 +9,35 @@ from datetime import timedelta
 
 from models.model import db
 from routes.routes import bp, init_jwt
-from conf.config import initial_config
-
-def create_app(test_config=None):
+from routes.utils import UploadRequest
+from models.search import init_search
+from models.cache import init_search_cache
+from main.debug import init_debug
+from main.metrics import init_metrics
+from main.serialization import init_json
+from main.compression import init_compression
+from models.blocklist import init_blocklist
+from models.outbox import init_outbox
+from models.passwords import init_passwords
+from models.pool import init_pool
+from models.seed import init_seed
+from models.migrations import init_migrations
+from conf.config import initial_config, ANUNCIANTE_LOADING, ANUNCIO_POLYMORPHIC_LOADING, IMAGE_MAX_SIZE, CONFIG_ENV_PREFIX
+
+def create_app(test_config=None, require_secrets=False):
+    """
+    Cria a aplicação. Sem `test_config`, a configuração vem das variáveis de ambiente
+    com o prefixo CONFIG_ENV_PREFIX. Com `require_secrets`, a criação falha se os
+    segredos de assinatura não estiverem configurados.
+    """
+    start = time.perf_counter()
     app = Flask(__name__)
 
     app.config['MAIL_SERVER'] = 'smtp.gmail.com'
     app.config['MAIL_PORT'] = 465
-    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    # EMAIL_USERNAME/EMAIL_PASSWORD são os nomes antigos, ainda aceitos
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME', os.getenv('EMAIL_USERNAME'))
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD', os.getenv('EMAIL_PASSWORD'))
     app.config['MAIL_USE_TLS'] = False
     app.config['MAIL_USE_SSL'] = True
 
@@ -24,19 +45,51 @@ def create_app(test_config=None):
     
     if test_config is None:
         app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///facilitai'
+        app.config.from_prefixed_env(CONFIG_ENV_PREFIX)
     else:
         app.config.from_mapping(test_config)
 
+    app.config.setdefault('REQUIRE_SECRETS', require_secrets)
+
     # app configurations
     setup_app(app)
 
+    app.extensions['facilitai_metrics'].record_startup('create_app', time.perf_counter() - start)
+
     return app
 
 
+def init_secrets(app):
+    """
+    Garante os segredos de assinatura da sessão e dos JWTs. Eles precisam ser os mesmos
+    em todos os workers e em todos os nós, senão um token emitido por um worker é
+    recusado pelos outros e todo restart desloga os usuários. Sem configuração, o
+    JWT_SECRET_KEY usa o SECRET_KEY; sem nenhum dos dois, é gerado um segredo
+    aleatório, válido só neste processo (aceitável em desenvolvimento e testes).
+    """
+    if app.config.get('SECRET_KEY') and not app.config.get('JWT_SECRET_KEY'):
+        app.config['JWT_SECRET_KEY'] = app.config['SECRET_KEY']
+
+    missing = [key for key in ('SECRET_KEY', 'JWT_SECRET_KEY') if not app.config.get(key)]
+
+    if missing and app.config.get('REQUIRE_SECRETS'):
+        raise RuntimeError(f'Segredos não configurados: {", ".join(missing)} (use {CONFIG_ENV_PREFIX}_<NOME>).')
+
+    for key in missing:
+        app.logger.warning('%s não configurado: usando um segredo aleatório deste processo.', key)
+        app.config[key] = gen_salt(48)
+
+
 def setup_app(app):
 
-    # configure secret key
-    app.config['SECRET_KEY'] = gen_salt(48)
+    # signing secrets shared by every worker
+    init_secrets(app)
+
+    # request metrics, registered first so latency covers the other hooks
+    init_metrics(app)
+
+    # json provider
+    init_json(app)
 
     # register main blueprint
     app.register_blueprint(bp)
@@ -44,16 +97,51 @@ def setup_app(app):
     # initialize JWTManager
     init_jwt(app)
 
+    # initialize text search
+    init_search(app)
+
+    # initialize search response cache
+    init_search_cache(app)
+
+    # relationship loading and debug headers
+    app.config.setdefault('ANUNCIANTE_LOADING', ANUNCIANTE_LOADING)
+    app.config.setdefault('ANUNCIO_POLYMORPHIC_LOADING', ANUNCIO_POLYMORPHIC_LOADING)
+    app.config.setdefault('DEBUG_HEADERS', app.debug)
+    init_debug(app)
+
+    # response compression negotiation
+    init_compression(app)
+
     # jwt configuration
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-    app.config['JWT_SECRET_KEY'] = gen_salt(48)
+
+    # revoked tokens fast path and expired tokens purge
+    init_blocklist(app)
+
+    # email outbox worker
+    init_outbox(app)
+
+    # password hashing pool
+    init_passwords(app)
 
     # path configurations
     initial_config()
 
-    # initialize database
-    @app.before_first_request
-    def create_tables():
-        db.create_all()
+    # uploads are streamed into the image storage and bounded in size
+    app.request_class = UploadRequest
+    app.config.setdefault('IMAGE_MAX_SIZE', IMAGE_MAX_SIZE)
+    # o Flask já define MAX_CONTENT_LENGTH como None (sem limite)
+    if app.config.get('MAX_CONTENT_LENGTH') is None:
+        app.config['MAX_CONTENT_LENGTH'] = app.config['IMAGE_MAX_SIZE'] + 64 * 1024
+
+    # connection pool configuration
+    init_pool(app)
+
+    # synthetic data bulk loader
+    init_seed(app)
 
+    # schema migrations, applied out-of-band with `flask migrate`
+    init_migrations(app)
+
+    # initialize database
     db.init_app(app)
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+
+from collections import defaultdict
+from flask import current_app, g, request
+
+from models.stats import LatencyStats
+from models.passwords import password_hasher
+from models.pool import pool_stats
+
+
+# limites (segundos) dos buckets do histograma de latência dos requests
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# chave do environ que marca os requests internos do aquecimento, fora das métricas
+WARMUP_ENVIRON = 'facilitai.warmup'
+
+
+class Metrics:
+    """
+    Métricas dos requests atendidos por este processo: latência por rota, respostas por
+    status, consultas ao banco e bytes de imagem servidos, além do tempo de cada etapa
+    da subida do processo.
+
+    Cada worker mantém as próprias métricas; o Prometheus deve coletar cada worker
+    (ou somar as séries pelo label `pid`).
+    """
+
+    def __init__(self):
+        self.latency = defaultdict(lambda: LatencyStats(REQUEST_BUCKETS))
+        self.responses = defaultdict(int)
+        self.queries = defaultdict(int)
+        self.query_time = defaultdict(float)
+        self.image_bytes = 0
+        self.startup = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, status, seconds, queries, query_time, image_bytes):
+        with self._lock:
+            latency = self.latency[endpoint]
+            self.responses[(endpoint, method, status)] += 1
+            self.queries[endpoint] += queries
+            self.query_time[endpoint] += query_time
+            self.image_bytes += image_bytes
+
+        latency.observe(seconds)
+
+    def record_startup(self, phase, seconds):
+        with self._lock:
+            self.startup[phase] = seconds
+
+    def exposition(self):
+        """
+        Formata as métricas no formato texto do Prometheus.
+        """
+        pid = os.getpid()
+        lines = []
+
+        with self._lock:
+            latency = dict(self.latency)
+            responses = dict(self.responses)
+            queries = dict(self.queries)
+            query_time = dict(self.query_time)
+            image_bytes = self.image_bytes
+            startup = dict(self.startup)
+
+        lines += _header('facilitai_request_duration_seconds', 'histogram', 'Latência dos requests por rota.')
+        for endpoint, stats in sorted(latency.items()):
+            lines += _histogram('facilitai_request_duration_seconds', stats, pid=pid, endpoint=endpoint)
+
+        lines += _header('facilitai_responses_total', 'counter', 'Respostas por rota, método e status.')
+        for (endpoint, method, status), count in sorted(responses.items()):
+            lines.append(_sample('facilitai_responses_total', count, pid=pid, endpoint=endpoint, method=method, status=status))
+
+        lines += _header('facilitai_db_queries_total', 'counter', 'Consultas ao banco feitas pelos requests de cada rota.')
+        for endpoint, count in sorted(queries.items()):
+            lines.append(_sample('facilitai_db_queries_total', count, pid=pid, endpoint=endpoint))
+
+        lines += _header('facilitai_db_query_seconds_total', 'counter', 'Tempo gasto em consultas ao banco pelos requests de cada rota.')
+        for endpoint, seconds in sorted(query_time.items()):
+            lines.append(_sample('facilitai_db_query_seconds_total', seconds, pid=pid, endpoint=endpoint))
+
+        lines += _header('facilitai_image_bytes_total', 'counter', 'Bytes de imagem servidos.')
+        lines.append(_sample('facilitai_image_bytes_total', image_bytes, pid=pid))
+
+        lines += _header('facilitai_startup_seconds', 'gauge', 'Duração de cada etapa da subida do worker.')
+        for phase, seconds in sorted(startup.items()):
+            lines.append(_sample('facilitai_startup_seconds', seconds, pid=pid, phase=phase))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _header(name, kind, description):
+    return [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+
+
+def _sample(name, value, **labels):
+    label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+    return f'{name}{{{label_text}}} {value}'
+
+
+def _histogram(name, stats, **labels):
+    data = stats.to_dict()
+    lines = [_sample(f'{name}_bucket', count, **labels, le=bound) for bound, count in data['buckets'].items()]
+    lines.append(_sample(f'{name}_bucket', data['count'], **labels, le='+Inf'))
+    lines.append(_sample(f'{name}_sum', data['total'], **labels))
+    lines.append(_sample(f'{name}_count', data['count'], **labels))
+
+    return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def metrics():
+    return current_app.extensions['facilitai_metrics']
+
+
+def exposition():
+    """
+    Métricas dos requests, do hash de senhas e do pool de conexões do worker atual,
+    no formato texto do Prometheus.
+    """
+    pid = os.getpid()
+    lines = []
+
+    lines += _header('facilitai_password_hash_seconds', 'histogram', 'Latência do hash e da verificação de senhas.')
+    for operation, stats in password_hasher().latency.items():
+        lines += _histogram('facilitai_password_hash_seconds', stats, pid=pid, operation=operation)
+
+    pool = pool_stats()
+
+    if 'checked_out' in pool:
+        for key in ('size', 'checked_in', 'checked_out', 'overflow'):
+            lines += _header(f'facilitai_db_pool_{key}', 'gauge', f'Conexões do pool: {key}.')
+            lines.append(_sample(f'facilitai_db_pool_{key}', pool[key], pid=pid))
+
+    if 'wait' in pool:
+        lines += _header('facilitai_db_pool_timeouts_total', 'counter', 'Checkouts que estouraram o timeout do pool.')
+        lines.append(_sample('facilitai_db_pool_timeouts_total', pool['timeouts'], pid=pid))
+
+    return metrics().exposition() + '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """
+    Registra a coleta das métricas dos requests. Deve ser chamada antes dos demais
+    hooks, para que a latência medida inclua o trabalho deles.
+    """
+    collector = Metrics()
+    app.extensions['facilitai_metrics'] = collector
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get('request_start', None)
+
+        if start is not None and not request.environ.get(WARMUP_ENVIRON):
+            collector.observe(
+                request.endpoint or 'nao_encontrado',
+                request.method,
+                response.status_code,
+                time.perf_counter() - start,
+                g.get('query_count', 0),
+                g.get('query_time', 0.0),
+                g.get('image_bytes', 0)
+            )
+
+        return response
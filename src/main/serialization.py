@@ -0,0 +1,120 @@
+import click
+import dataclasses
+import decimal
+import enum
+import time
+import uuid
+
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+
+from conf.config import FAST_JSON
+
+try:
+    import orjson
+except ImportError:  # dependência opcional: sem ela as respostas usam o json da biblioteca padrão
+    orjson = None
+
+
+def _default(o):
+    """
+    Converte os tipos que o json não conhece. Enums (como StatusAnuncio) viram o seu
+    valor, datas viram ISO 8601 e Decimal vira texto, sem perder precisão.
+    """
+    if isinstance(o, enum.Enum): return o.value
+    if isinstance(o, (datetime, date)): return o.isoformat()
+    if isinstance(o, (decimal.Decimal, uuid.UUID)): return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type): return dataclasses.asdict(o)
+    if hasattr(o, '__html__'): return str(o.__html__())
+
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """
+    Provider do json da biblioteca padrão com a mesma conversão de tipos do FastJSONProvider.
+    """
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+
+class FastJSONProvider(StdlibJSONProvider):
+    """
+    Provider que serializa com o orjson, escrevendo bytes UTF-8 direto na resposta.
+
+    Cai para o json da biblioteca padrão quando o orjson não está instalado, quando
+    são pedidas opções que o orjson não suporta (argumentos extras em `dumps`) e nas
+    respostas indentadas do modo debug.
+    """
+
+    def _options(self):
+        return orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs: return super().dumps(obj, **kwargs)
+
+        return orjson.dumps(obj, default=_default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs: return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self._options())
+
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def _sample_ads(count):
+    """
+    Anúncios no formato de `get_to_dict`, para medir a serialização sem banco.
+    """
+    return [{
+        'titulo': f'Anúncio {i}',
+        'anunciante': f'usuario.{i % 50}',
+        'descricao': 'Livro em ótimo estado, com poucas marcações a lápis. ' * 3,
+        'preco': 10.0 + i * 0.5,
+        'titulo_livro': f'Livro {i}',
+        'autor': 'Autor Exemplo',
+        'genero': 'Ficção',
+        'status': 'AGUARDANDO_ACAO',
+        'aceita_trocas': i % 2 == 0,
+        'image_location': f'/image/{i:064x}'
+    } for i in range(count)]
+
+
+def init_json(app):
+    """
+    Registra o provider de JSON da aplicação: FastJSONProvider quando FAST_JSON está
+    ligado, ou o json da biblioteca padrão.
+    """
+    fast = app.config.get('FAST_JSON', FAST_JSON)
+    app.json = FastJSONProvider(app) if fast else StdlibJSONProvider(app)
+
+    @app.cli.command('json-benchmark')
+    @click.option('--ads', default=1000, help='Quantidade de anúncios por resposta.')
+    @click.option('--rounds', default=50, help='Quantidade de serializações medidas.')
+    def json_benchmark_command(ads, rounds):
+        """Mede o tempo de serialização de uma listagem de anúncios em cada provider."""
+        sample = _sample_ads(ads)
+        providers = [('json (biblioteca padrão)', DefaultJSONProvider(app)), ('StdlibJSONProvider', StdlibJSONProvider(app))]
+
+        if orjson is not None: providers.append(('FastJSONProvider (orjson)', FastJSONProvider(app)))
+
+        for name, provider in providers:
+            latencies = []
+
+            for _ in range(rounds):
+                start = time.perf_counter()
+                provider.response(sample).get_data()
+                latencies.append(time.perf_counter() - start)
+
+            latencies.sort()
+            median = latencies[len(latencies) // 2] * 1000 * 1000 / ads
+            click.echo(f'{name}: mediana {median:.2f} ms por 1000 anúncios')
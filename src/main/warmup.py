@@ -0,0 +1,66 @@
+import time
+import uuid
+
+from models.model import db, User, TokenBlockList
+from models.blocklist import revoked_tokens
+from models.migrations import pending_migrations
+from models.passwords import password_hasher
+from models.pool import warm_pool
+from main.metrics import metrics, WARMUP_ENVIRON
+from conf.config import SEARCH_BOOKS, SEARCH_APARTMENTS, SEARCH_BOOKS_FACETS, SEARCH_APARTMENTS_FACETS
+
+
+def _warm_auth():
+    # compila as consultas feitas antes de todo endpoint autenticado e monta o filtro
+    # de Bloom dos tokens revogados
+    User.query.filter_by(username='').one_or_none()
+    TokenBlockList.query.filter_by(jti=str(uuid.uuid4())).scalar()
+    revoked_tokens().rebuild()
+
+
+def _warm_search(app):
+    # a primeira página de cada busca, sem filtros, é a mais pedida: as respostas ficam
+    # no cache de buscas (já comprimidas) e as consultas, compiladas
+    client = app.test_client()
+
+    for endpoint in (SEARCH_BOOKS, SEARCH_APARTMENTS, SEARCH_BOOKS_FACETS, SEARCH_APARTMENTS_FACETS):
+        client.post(endpoint, json={}, headers={'Accept-Encoding': 'gzip, deflate, br, zstd'}, environ_base={WARMUP_ENVIRON: True})
+
+
+def warm_up(app):
+    """
+    Prepara o worker antes de ele aceitar requests: abre as conexões do pool, compila
+    as consultas quentes (autenticação e buscas), preenche os caches e sobe o pool de
+    hash de senhas. Deve ser chamada já no processo worker (no gunicorn, em `post_fork`).
+
+    O tempo de cada etapa fica na métrica `facilitai_startup_seconds`.
+
+    Returns:
+        A duração (segundos) de cada etapa.
+    """
+    timings = {}
+
+    def timed(phase, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        timings[phase] = time.perf_counter() - start
+
+    start = time.perf_counter()
+
+    with app.app_context():
+        pending = pending_migrations()
+        if pending: app.logger.warning('Migrações pendentes: %s (rode `flask migrate`).', pending)
+
+        timed('warmup_pool', warm_pool)
+        timed('warmup_auth', _warm_auth)
+        timed('warmup_passwords', password_hasher().start)
+        db.session.remove()
+
+    timed('warmup_search', _warm_search, app)
+    timings['warmup'] = time.perf_counter() - start
+
+    with app.app_context():
+        for phase, seconds in timings.items():
+            metrics().record_startup(phase, seconds)
+
+    return timings
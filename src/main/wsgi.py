@@ -0,0 +1,7 @@
+from main.main import create_app
+
+
+# ponto de entrada de produção (`gunicorn main.wsgi:app`): a configuração vem das
+# variáveis FACILITAI_* e os segredos de assinatura são obrigatórios, para que todos
+# os workers e nós aceitem os tokens uns dos outros
+app = create_app(require_secrets=True)
@@ -0,0 +1,182 @@
+import click
+import hashlib
+import math
+import threading
+import time
+
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+
+from models.model import db, TokenBlockList
+from conf.config import (
+    BLOCKLIST_BLOOM_CAPACITY,
+    BLOCKLIST_BLOOM_ERROR_RATE,
+    BLOCKLIST_SYNC_INTERVAL,
+    BLOCKLIST_SYNC_MARGIN,
+    BLOCKLIST_PURGE_INTERVAL
+)
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom: responde se uma chave *pode* ter sido adicionada.
+
+    Nunca dá falso negativo; falsos positivos acontecem com probabilidade próxima de
+    `error_rate` enquanto o número de chaves não passar de `capacity`.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, key):
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._positions(key))
+
+
+class RevokedTokens:
+    """
+    Caminho rápido da verificação de revogação de tokens.
+
+    Mantém um filtro de Bloom com os JTIs revogados ainda não expirados. Tokens fora
+    do filtro não foram revogados e dispensam a consulta à TokenBlockList. O filtro é
+    montado a partir do banco no primeiro uso e sincronizado a cada
+    BLOCKLIST_SYNC_INTERVAL segundos com as revogações feitas por outros workers.
+    """
+
+    def __init__(self, capacity, error_rate, sync_interval, sync_margin):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.sync_margin = timedelta(seconds=sync_margin)
+        self._bloom = None
+        self._synced_since = None
+        self._synced_at = 0
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        started = utcnow()
+
+        for jti, in db.session.query(TokenBlockList.jti).filter(TokenBlockList.created_at >= expiry_cutoff()):
+            bloom.add(jti)
+
+        with self._lock:
+            self._bloom, self._synced_since, self._synced_at = bloom, started, time.monotonic()
+
+    def sync(self):
+        """
+        Adiciona as revogações feitas desde a última sincronização. A janela volta
+        BLOCKLIST_SYNC_MARGIN segundos antes dela: `created_at` é definido antes do commit
+        (e pelo relógio de outro nó), então uma revogação confirmada depois da última
+        leitura pode ter uma data anterior a ela.
+        """
+        with self._lock:
+            since = self._synced_since
+
+        started = utcnow()
+        tokens = db.session.query(TokenBlockList.jti).filter(TokenBlockList.created_at >= since - self.sync_margin).all()
+
+        with self._lock:
+            for jti, in tokens:
+                self._bloom.add(jti)
+
+            self._synced_since, self._synced_at = started, time.monotonic()
+
+    def add(self, jti):
+        if self._bloom is None: return
+
+        with self._lock:
+            self._bloom.add(jti)
+
+    def might_be_revoked(self, jti):
+        if self._bloom is None:
+            self.rebuild()
+        elif time.monotonic() - self._synced_at >= self.sync_interval:
+            self.sync()
+
+        return jti in self._bloom
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def expiry_cutoff():
+    """
+    Instante (UTC) antes do qual todo token emitido já expirou.
+    """
+    return utcnow() - current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+
+
+def purge_expired_tokens():
+    """
+    Remove da TokenBlockList os JTIs de tokens que já expiraram e remonta o filtro.
+
+    Returns:
+        A quantidade de registros removidos.
+    """
+    removed = TokenBlockList.query.filter(TokenBlockList.created_at < expiry_cutoff()).delete(synchronize_session=False)
+    db.session.commit()
+
+    revoked_tokens().rebuild()
+
+    return removed
+
+
+def revoked_tokens():
+    return current_app.extensions['facilitai_blocklist']
+
+
+def init_blocklist(app):
+    app.extensions['facilitai_blocklist'] = RevokedTokens(
+        app.config.get('BLOCKLIST_BLOOM_CAPACITY', BLOCKLIST_BLOOM_CAPACITY),
+        app.config.get('BLOCKLIST_BLOOM_ERROR_RATE', BLOCKLIST_BLOOM_ERROR_RATE),
+        app.config.get('BLOCKLIST_SYNC_INTERVAL', BLOCKLIST_SYNC_INTERVAL),
+        app.config.get('BLOCKLIST_SYNC_MARGIN', BLOCKLIST_SYNC_MARGIN)
+    )
+
+    @app.cli.command('purge-blocklist')
+    def purge_blocklist_command():
+        """Remove os tokens revogados que já expiraram."""
+        click.echo(f'{purge_expired_tokens()} tokens removidos.')
+
+    purge_interval = app.config.get('BLOCKLIST_PURGE_INTERVAL', BLOCKLIST_PURGE_INTERVAL)
+    if not purge_interval: return
+
+    purge_thread = []
+    lock = threading.Lock()
+
+    # a limpeza periódica é iniciada no primeiro request, já dentro do processo worker
+    @app.before_request
+    def start_blocklist_purge():
+        if purge_thread: return
+
+        with lock:
+            if purge_thread: return
+
+            purge_thread.append(threading.Thread(target=_purge_loop, args=(app, purge_interval), daemon=True))
+            purge_thread[0].start()
+
+
+def _purge_loop(app, interval):
+    while True:
+        time.sleep(interval)
+
+        with app.app_context():
+            try:
+                purge_expired_tokens()
+            except Exception as e:
+                app.logger.exception(e)
+                db.session.rollback()
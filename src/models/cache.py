@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+
+from collections import OrderedDict
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models.model import db
+from conf.config import (
+    SEARCH_CACHE_BACKEND,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_MAX_BYTES
+)
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache em memória limitado em quantidade de itens, com expiração por tempo (TTL).
+
+    Quando o limite é atingido, o item usado há mais tempo é descartado (LRU). Com
+    `max_bytes`, a soma dos pesos dos itens (`weigher`, por padrão `len`) também é
+    limitada. É seguro para uso entre threads do mesmo processo.
+    """
+
+    def __init__(self, maxsize, ttl, timer=time.monotonic, max_bytes=None, weigher=len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._weigher = weigher
+        self._timer = timer
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key, _MISSING)
+
+            if item is _MISSING: return default
+
+            value, expires_at, weight = item
+
+            if expires_at <= self._timer():
+                self._pop(key)
+                return default
+
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        weight = self._weigher(value) if self.max_bytes else 0
+
+        # itens maiores que o cache inteiro não são guardados
+        if self.max_bytes and weight > self.max_bytes: return
+
+        with self._lock:
+            self._pop(key)
+            self._items[key] = (value, self._timer() + self.ttl, weight)
+            self._bytes += weight
+
+            while len(self._items) > self.maxsize or (self.max_bytes and self._bytes > self.max_bytes):
+                self._pop(next(iter(self._items)))
+
+    def _pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None: self._bytes -= item[2]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._items)
+
+
+def snapshot(instance):
+    """
+    Copia os valores das colunas de uma entidade, para guardar em cache sem
+    manter a instância (e a sessão) viva entre requests.
+    """
+    mapper = type(instance).__mapper__
+    return {attr.key: getattr(instance, attr.key) for attr in mapper.column_attrs}
+
+
+def restore(model, values):
+    """
+    Reconstrói a entidade a partir de um snapshot e a associa à sessão atual sem
+    consultar o banco.
+    """
+    instance = model.__mapper__.class_manager.new_instance()
+
+    for key, value in values.items():
+        set_committed_value(instance, key, value)
+
+    make_transient_to_detached(instance)
+
+    return db.session.merge(instance, load=False)
+
+
+class LocalBackend:
+    """
+    Armazenamento do cache de buscas na memória do processo.
+    """
+
+    def __init__(self, maxsize, ttl, max_bytes):
+        self._cache = TTLCache(maxsize, ttl, max_bytes=max_bytes, weigher=_response_weight)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisBackend:
+    """
+    Armazenamento do cache de buscas compartilhado entre workers, em um servidor Redis.
+
+    As chaves levam o número da geração atual do cache; invalidar incrementa a geração,
+    descartando de uma vez as respostas guardadas por todos os workers. O tamanho é
+    limitado pela política de memória do próprio Redis (ex.: `maxmemory-policy allkeys-lru`).
+    """
+
+    def __init__(self, url, ttl, prefix='facilitai:search'):
+        # dependência opcional, necessária apenas com SEARCH_CACHE_BACKEND = 'redis'
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._generation = f'{prefix}:generation'
+        self._get = self._redis.register_script(_REDIS_GET)
+        self._set = self._redis.register_script(_REDIS_SET)
+
+    def get(self, key):
+        value = self._get(keys=[self._generation], args=[self.prefix, key])
+        return _decode_response(value) if value is not None else None
+
+    def set(self, key, value):
+        self._set(keys=[self._generation], args=[self.prefix, key, _encode_response(value), int(self.ttl)])
+
+    def clear(self):
+        self._redis.incr(self._generation)
+
+
+# lêem a geração e a resposta no mesmo comando: uma única ida ao Redis por operação
+_REDIS_GET = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+return redis.call('GET', ARGV[1] .. ':' .. generation .. ':' .. ARGV[2])
+"""
+
+_REDIS_SET = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+return redis.call('SET', ARGV[1] .. ':' .. generation .. ':' .. ARGV[2], ARGV[3], 'EX', ARGV[4])
+"""
+
+
+def _encode_response(value):
+    # cabeçalhos em JSON (sem quebras de linha) seguidos do corpo, sem pickle
+    body, headers = value
+    return json.dumps(headers).encode() + b'\n' + body
+
+
+def _decode_response(value):
+    headers, _, body = value.partition(b'\n')
+    return body, json.loads(headers)
+
+
+def _response_weight(value):
+    body, headers = value
+    return len(body) + sum(len(name) + len(content) for name, content in headers.items())
+
+
+def init_search_cache(app):
+    """
+    Cria o cache de respostas de busca conforme SEARCH_CACHE_BACKEND (`local`, `redis`
+    ou None para desligar).
+    """
+    backend = app.config.get('SEARCH_CACHE_BACKEND', SEARCH_CACHE_BACKEND)
+    ttl = app.config.get('SEARCH_CACHE_TTL', SEARCH_CACHE_TTL)
+
+    if backend == 'local':
+        cache = LocalBackend(
+            app.config.get('SEARCH_CACHE_SIZE', SEARCH_CACHE_SIZE),
+            ttl,
+            app.config.get('SEARCH_CACHE_MAX_BYTES', SEARCH_CACHE_MAX_BYTES)
+        )
+    elif backend == 'redis':
+        cache = RedisBackend(app.config['SEARCH_CACHE_REDIS_URL'], ttl)
+    else:
+        cache = None
+
+    app.extensions['facilitai_search_cache'] = cache
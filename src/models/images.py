@@ -0,0 +1,245 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from pathlib import Path
+from flask import current_app
+from sqlalchemy import event, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from models.model import db, Imagem
+from conf.config import IMAGE_PATH, IMAGE_CHUNK_SIZE, IMAGE_MAX_SIZE
+
+
+# assinaturas (magic numbers) dos formatos de imagem aceitos
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+SNIFF_SIZE = 12
+
+
+def sniff_mimetype(header):
+    """
+    Identifica o tipo da imagem pelos primeiros bytes do arquivo.
+
+    Returns:
+        O mimetype da imagem ou None se o formato não for reconhecido.
+    """
+    for signature, mimetype in _SIGNATURES:
+        if header.startswith(signature): return mimetype
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP': return 'image/webp'
+
+    return None
+
+
+def is_content_addressed(name):
+    return re.fullmatch(r'[0-9a-f]{64}', name) is not None
+
+
+def image_dir():
+    return Path(current_app.config.get('IMAGE_PATH', IMAGE_PATH)).expanduser()
+
+
+def image_file(name):
+    return image_dir() / name
+
+
+class ImageUpload:
+    """
+    Destino de escrita de um upload de imagem, preenchido à medida que o corpo do
+    request chega.
+
+    Os bytes são escritos em blocos em um arquivo temporário no diretório das imagens
+    enquanto o hash SHA-256 é calculado. O tipo da imagem é identificado pelos
+    primeiros bytes: formatos desconhecidos (415) e arquivos maiores que IMAGE_MAX_SIZE
+    (413) são rejeitados assim que detectados, sem ler o restante do upload.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.mimetype = None
+        self._header = b''
+        self._digest = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=image_dir(), prefix='.upload-', delete=False)
+        self._stored = False
+
+    @property
+    def name(self):
+        return self._digest.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+
+        if self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge('Imagem maior que o tamanho máximo permitido.')
+
+        if len(self._header) < SNIFF_SIZE:
+            self._header += data[:SNIFF_SIZE - len(self._header)]
+            if len(self._header) == SNIFF_SIZE: self._sniff()
+
+        self._digest.update(data)
+        self._file.write(data)
+
+        return len(data)
+
+    def _sniff(self):
+        self.mimetype = sniff_mimetype(self._header)
+
+        if self.mimetype is None:
+            self.close()
+            raise UnsupportedMediaType('Formato de imagem não suportado.')
+
+    def finish(self):
+        """
+        Conclui a escrita, identificando o tipo de arquivos menores que SNIFF_SIZE.
+        """
+        if self.mimetype is None: self._sniff()
+
+        self._file.flush()
+
+    def store(self, path):
+        self.finish()
+        self._file.close()
+
+        # bytes idênticos: substituir o arquivo existente não altera o conteúdo
+        os.replace(self._file.name, path)
+        self._stored = True
+
+    def close(self):
+        self._file.close()
+
+        if not self._stored and os.path.exists(self._file.name):
+            os.unlink(self._file.name)
+
+    def __getattr__(self, attribute):
+        # leitura, seek e demais operações de arquivo usadas pelo FileStorage
+        return getattr(self._file, attribute)
+
+
+def image_upload_stream():
+    return ImageUpload(current_app.config.get('IMAGE_MAX_SIZE', IMAGE_MAX_SIZE))
+
+
+def store_image(upload):
+    """
+    Grava a imagem enviada endereçada pelo conteúdo e registra uma nova referência a ela.
+
+    Imagens com os mesmos bytes recebem o mesmo nome e ocupam um único arquivo no disco.
+    Uploads que não chegaram por um ImageUpload (ver UploadRequest) são copiados
+    em blocos para um.
+
+    Returns:
+        O nome do arquivo da imagem.
+    """
+    image = upload.stream
+
+    if not isinstance(image, ImageUpload):
+        image = image_upload_stream()
+
+        while True:
+            chunk = upload.stream.read(IMAGE_CHUNK_SIZE)
+            if not chunk: break
+            image.write(chunk)
+
+    try:
+        image.finish()
+        acquire_image(image.name, image.mimetype, image.size)
+        image.store(image_file(image.name))
+    finally:
+        image.close()
+
+    # o arquivo já está no lugar: um rollback o apaga se nenhum registro o usar
+    _pending_files('facilitai_stored_images').append(image.name)
+
+    return image.name
+
+
+def acquire_image(name, mimetype, size):
+    """
+    Incrementa a contagem de referências da imagem, criando o registro se necessário.
+
+    Um único INSERT ... ON CONFLICT DO UPDATE: uploads simultâneos dos mesmos bytes não
+    disputam a criação do registro. O lock da imagem fica com a transação até o commit,
+    cobrindo também a gravação do arquivo (ver `_unlink_unreferenced`).
+    """
+    if db.engine.dialect.name == 'postgresql':
+        _lock_image(db.session, name)
+        dialect = postgresql
+    else:
+        dialect = sqlite
+
+    statement = (dialect.insert(Imagem)
+                 .values(nome=name, mimetype=mimetype, tamanho=size, referencias=1)
+                 .on_conflict_do_update(index_elements=[Imagem.nome], set_={'referencias': Imagem.referencias + 1}))
+
+    db.session.execute(statement)
+
+
+def release_image(name):
+    """
+    Decrementa a contagem de referências da imagem e apaga o arquivo quando ela deixa
+    de ser usada. Imagens antigas, gravadas antes do endereçamento por conteúdo, não
+    têm registro e são ignoradas.
+
+    O arquivo só é apagado depois do commit: um rollback mantém a imagem no disco.
+    """
+    if not name: return
+
+    imagem = db.session.query(Imagem).filter_by(nome=name).with_for_update().populate_existing().one_or_none()
+
+    if imagem is None: return
+
+    imagem.referencias -= 1
+
+    if imagem.referencias <= 0:
+        db.session.delete(imagem)
+        _pending_files('facilitai_released_images').append(name)
+
+
+def _pending_files(key):
+    # nomes das imagens a conferir depois da transação, com o banco em que foram gravadas
+    pending = db.session.info.setdefault(key, {})
+    return pending.setdefault((db.engine, str(image_dir())), [])
+
+
+def _lock_image(connection, name):
+    # advisory lock do PostgreSQL pelo hash da imagem, liberado no fim da transação (no
+    # SQLite as escritas já são serializadas)
+    connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': int(name[:15], 16)})
+
+
+def _unlink_unreferenced(pending):
+    """
+    Apaga os arquivos das imagens que não têm mais registro. A conferência é feita em uma
+    transação nova, sob o lock da imagem: um upload simultâneo dos mesmos bytes que já
+    recriou o registro (e regravou o arquivo) mantém o arquivo no disco.
+    """
+    for (engine, directory), names in pending.items():
+        for name in names:
+            with engine.begin() as connection:
+                if connection.dialect.name == 'postgresql': _lock_image(connection, name)
+                exists = connection.execute(select(Imagem.nome).where(Imagem.nome == name)).first()
+
+                if exists is None: (Path(directory) / name).unlink(missing_ok=True)
+
+
+@event.listens_for(Session, 'after_commit')
+def _unlink_released_images(session):
+    session.info.pop('facilitai_stored_images', None)
+    _unlink_unreferenced(session.info.pop('facilitai_released_images', {}))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _unlink_stored_images(session):
+    session.info.pop('facilitai_released_images', None)
+    _unlink_unreferenced(session.info.pop('facilitai_stored_images', {}))
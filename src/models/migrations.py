@@ -0,0 +1,154 @@
+import click
+
+from datetime import datetime, timezone
+from sqlalchemy import inspect, select, text
+
+from models.model import db, Favorites, TokenBlockList
+from models.search import SEARCH_COLUMNS
+
+
+# versões aplicadas do esquema, uma linha por migração
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('descricao', db.String, nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+# chave do advisory lock do PostgreSQL que impede duas migrações simultâneas
+MIGRATION_LOCK_KEY = 7280001
+
+MIGRATIONS = []
+
+
+def migration(version, descricao):
+    """
+    Registra uma migração do esquema. Cada migração recebe a conexão da transação da
+    migração e é aplicada uma única vez, na ordem das versões:
+
+        @migration(2, 'Índice dos anúncios por status')
+        def _index_anuncio_status(connection):
+            connection.execute(text('CREATE INDEX ix_anuncio_status ON anuncio (status)'))
+    """
+    def register(function):
+        MIGRATIONS.append((version, descricao, function))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return function
+
+    return register
+
+
+@migration(1, 'Esquema inicial')
+def _initial_schema(connection):
+    # também adota os bancos criados pelo antigo create_all na primeira requisição
+    db.metadata.create_all(connection)
+
+
+def _create_index(connection, table, name):
+    # CREATE INDEX só se o índice ainda não existir (bancos criados pelo create_all atual)
+    index = next(index for index in table.indexes if index.name == name)
+    index.create(connection, checkfirst=True)
+
+
+@migration(2, 'Favoritos únicos por usuário e anúncio')
+def _unique_favorites(connection):
+    table = Favorites.__table__
+    inspector = inspect(connection)
+
+    if 'uq_favorites_user_anuncio' not in {constraint['name'] for constraint in inspector.get_unique_constraints(table.name)}:
+        # mantém o favorito mais antigo de cada par repetido
+        connection.execute(text(
+            'DELETE FROM favorites WHERE id NOT IN '
+            '(SELECT MIN(id) FROM favorites GROUP BY user_id, anuncio_id)'
+        ))
+
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('ALTER TABLE favorites ADD CONSTRAINT uq_favorites_user_anuncio UNIQUE (user_id, anuncio_id)'))
+        elif 'uq_favorites_user_anuncio' not in {index['name'] for index in inspector.get_indexes(table.name)}:
+            # o SQLite não adiciona restrições a tabelas existentes; o índice único equivale
+            connection.execute(text('CREATE UNIQUE INDEX uq_favorites_user_anuncio ON favorites (user_id, anuncio_id)'))
+
+    _create_index(connection, table, 'ix_favorites_anuncio_id')
+
+
+@migration(3, 'Índices de trigramas da busca livre')
+def _trigram_indexes(connection):
+    if connection.dialect.name != 'postgresql': return
+
+    connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+
+    for column in {column for columns in SEARCH_COLUMNS.values() for column in columns}:
+        _create_index(connection, column.table, f'ix_{column.table.name}_{column.name}_trgm')
+
+
+@migration(4, 'Índice dos tokens revogados por data')
+def _token_block_list_created_at(connection):
+    table = TokenBlockList.__table__
+    _create_index(connection, table, f'ix_{table.name}_created_at')
+
+
+def _applied_versions(connection):
+    if not inspect(connection).has_table(schema_version.name): return set()
+
+    return set(connection.execute(select(schema_version.c.version)).scalars())
+
+
+def pending_migrations():
+    """
+    Versões ainda não aplicadas ao banco, em ordem.
+    """
+    with db.engine.connect() as connection:
+        applied = _applied_versions(connection)
+
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+def migrate():
+    """
+    Aplica as migrações pendentes em uma única transação. Um banco vazio recebe o
+    esquema atual dos modelos de uma vez e é marcado com todas as versões.
+
+    Returns:
+        As versões aplicadas.
+    """
+    applied_now = []
+
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+
+        fresh = not inspect(connection).has_table('anuncio')
+        applied = _applied_versions(connection)
+
+        if fresh: db.metadata.create_all(connection)
+
+        for version, descricao, function in MIGRATIONS:
+            if version in applied: continue
+
+            if not fresh: function(connection)
+
+            connection.execute(schema_version.insert().values(
+                version=version,
+                descricao=descricao,
+                applied_at=datetime.now(timezone.utc).replace(tzinfo=None)
+            ))
+            applied_now.append(version)
+
+    return applied_now
+
+
+def init_migrations(app):
+
+    @app.cli.command('migrate')
+    @click.option('--check', is_flag=True, help='Só lista as migrações pendentes, terminando com erro se houver alguma.')
+    def migrate_command(check):
+        """Aplica as migrações pendentes do esquema do banco."""
+        if check:
+            pending = pending_migrations()
+            click.echo(f'Migrações pendentes: {", ".join(map(str, pending))}.' if pending else 'Esquema atualizado.')
+
+            if pending: raise SystemExit(1)
+            return
+
+        applied = migrate()
+        click.echo(f'Migrações aplicadas: {", ".join(map(str, applied))}.' if applied else 'Nenhuma migração pendente.')
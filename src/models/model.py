@@ -203,7 +203,7 @@ class TokenBlockList(db.Model):
 
     jti = db.Column(db.String(36), nullable=False, index=True)
 
-    created_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
 
     def __init__(self, jti, created_at):
         self.jti = jti
@@ -219,6 +219,76 @@ class Favorites(db.Model):
 
     anuncio_id = db.Column(db.Integer, db.ForeignKey('anuncio.id'), nullable=False)
 
+    # a restrição única também serve de índice para os favoritos de cada usuário
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'anuncio_id', name='uq_favorites_user_anuncio'),
+        db.Index('ix_favorites_anuncio_id', 'anuncio_id'),
+    )
+
     def __init__(self, user_id, anuncio_id):
         self.user_id = user_id
         self.anuncio_id = anuncio_id
+
+
+class Imagem(db.Model):
+    __tablename__ = 'imagem'
+
+    # nome do arquivo: hash SHA-256 do conteúdo da imagem
+    nome = db.Column(db.String(64), primary_key=True)
+
+    mimetype = db.Column(db.String(50), nullable=False)
+
+    tamanho = db.Column(db.Integer, nullable=False)
+
+    # quantidade de anúncios (ad_img) e usuários (profile_img) que usam a imagem
+    referencias = db.Column(db.Integer, default=0, nullable=False)
+
+    def __init__(self, nome, mimetype, tamanho):
+        self.nome = nome
+        self.mimetype = mimetype
+        self.tamanho = tamanho
+        self.referencias = 0
+
+
+class StatusEmail(Enum):
+    PENDENTE = 'Pendente'
+    ENVIADO = 'Enviado'
+    FALHOU = 'Falhou'
+
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    to_email = db.Column(db.String, nullable=False)
+
+    subject = db.Column(db.String, nullable=False)
+
+    body = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(20), default=StatusEmail.PENDENTE.name, nullable=False)
+
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+
+    last_error = db.Column(db.String, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    # o worker busca os emails pendentes cujo próximo envio já venceu
+    __table_args__ = (
+        db.Index('ix_email_outbox_pending', 'status', 'next_attempt_at'),
+    )
+
+    def __init__(self, to_email, subject, body, created_at):
+        self.to_email = to_email
+        self.subject = subject
+        self.body = body
+        self.status = StatusEmail.PENDENTE.name
+        self.attempts = 0
+        self.created_at = created_at
+        self.next_attempt_at = created_at
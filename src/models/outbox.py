@@ -0,0 +1,227 @@
+import click
+import smtplib
+import threading
+import time
+
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from flask import current_app
+
+from models.model import db, EmailOutbox, StatusEmail
+from conf.config import (
+    MAIL_DEFAULT_SENDER,
+    MAIL_BATCH_SIZE,
+    MAIL_MAX_ATTEMPTS,
+    MAIL_RETRY_BACKOFF,
+    MAIL_WORKER_INTERVAL,
+    MAIL_IDLE_TIMEOUT,
+    MAIL_CLAIM_TIMEOUT
+)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue_email(to_email, subject, message):
+    """
+    Coloca um email na caixa de saída. O envio é feito pelo EmailWorker, fora do request.
+    """
+    email = EmailOutbox(to_email, subject, message, _utcnow())
+    db.session.add(email)
+    db.session.commit()
+
+    worker = current_app.extensions.get('facilitai_outbox')
+    if worker: worker.wake()
+
+    return email
+
+
+class EmailWorker:
+    """
+    Envia os emails da caixa de saída em lotes, reaproveitando a conexão SMTP.
+
+    Emails que falham são reagendados com backoff exponencial
+    (MAIL_RETRY_BACKOFF * 2 ** (tentativas - 1), ou seja, MAIL_RETRY_BACKOFF na
+    primeira nova tentativa) até MAIL_MAX_ATTEMPTS tentativas. A conexão é fechada
+    depois de MAIL_IDLE_TIMEOUT segundos sem envios.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config.get('MAIL_BATCH_SIZE', MAIL_BATCH_SIZE)
+        self.max_attempts = app.config.get('MAIL_MAX_ATTEMPTS', MAIL_MAX_ATTEMPTS)
+        self.backoff = app.config.get('MAIL_RETRY_BACKOFF', MAIL_RETRY_BACKOFF)
+        self.idle_timeout = app.config.get('MAIL_IDLE_TIMEOUT', MAIL_IDLE_TIMEOUT)
+        self.claim_timeout = app.config.get('MAIL_CLAIM_TIMEOUT', MAIL_CLAIM_TIMEOUT)
+        self._connection = None
+        self._last_used = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        config = self.app.config
+        smtp = smtplib.SMTP_SSL if config.get('MAIL_USE_SSL') else smtplib.SMTP
+
+        connection = smtp(config['MAIL_SERVER'], config['MAIL_PORT'])
+
+        if config.get('MAIL_USE_TLS'): connection.starttls()
+        if config.get('MAIL_USERNAME'): connection.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+
+        return connection
+
+    def close(self):
+        if self._connection is None: return
+
+        try:
+            self._connection.quit()
+        except smtplib.SMTPException:
+            pass
+
+        self._connection = None
+
+    def send_batch(self):
+        """
+        Envia um lote de emails pendentes. Deve ser chamado dentro de um app context.
+
+        Returns:
+            A quantidade de emails processados no lote.
+        """
+        now = _utcnow()
+
+        emails = (EmailOutbox.query
+                  .filter(EmailOutbox.status == StatusEmail.PENDENTE.name, EmailOutbox.next_attempt_at <= now)
+                  .order_by(EmailOutbox.next_attempt_at)
+                  .limit(self.batch_size)
+                  .with_for_update(skip_locked=True)
+                  .all())
+
+        if not emails: return 0
+
+        # reserva o lote adiando a próxima tentativa e libera os locks antes de falar com
+        # o servidor SMTP; se o processo morrer, os emails voltam à fila depois do prazo
+        claimed = [(email.id, email.attempts, self._message(email)) for email in emails]
+
+        for email in emails:
+            email.next_attempt_at = now + timedelta(seconds=self.claim_timeout)
+
+        db.session.commit()
+
+        sent = []
+
+        for email_id, attempts, msg in claimed:
+            try:
+                self._send(msg)
+            except Exception as e:
+                attempts += 1
+                values = {'attempts': attempts, 'last_error': str(e)[:500]}
+
+                if attempts >= self.max_attempts:
+                    values['status'] = StatusEmail.FALHOU.name
+                else:
+                    values['next_attempt_at'] = _utcnow() + timedelta(seconds=self.backoff * 2 ** (attempts - 1))
+
+                EmailOutbox.query.filter_by(id=email_id).update(values, synchronize_session=False)
+            else:
+                sent.append(email_id)
+
+        if sent:
+            (EmailOutbox.query
+             .filter(EmailOutbox.id.in_(sent))
+             .update({
+                 EmailOutbox.attempts: EmailOutbox.attempts + 1,
+                 EmailOutbox.status: StatusEmail.ENVIADO.name,
+                 EmailOutbox.sent_at: _utcnow()
+             }, synchronize_session=False))
+
+        db.session.commit()
+
+        return len(claimed)
+
+    def _message(self, email):
+        msg = MIMEMultipart()
+        msg['From'] = self.app.config.get('MAIL_DEFAULT_SENDER', MAIL_DEFAULT_SENDER)
+        msg['To'] = email.to_email
+        msg['Subject'] = email.subject
+        msg.attach(MIMEText(email.body, 'plain'))
+
+        return msg
+
+    def _send(self, msg):
+        if self._connection is None:
+            self._connection = self.connect()
+
+        try:
+            self._connection.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # a conexão reaproveitada caiu: reconecta e tenta mais uma vez
+            self._connection = None
+            self._connection = self.connect()
+            self._connection.send_message(msg)
+        except OSError:
+            self._connection = None
+            raise
+
+        self._last_used = time.monotonic()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def run(self, interval):
+        """
+        Laço do worker: envia lotes enquanto houver pendências e espera `interval`
+        segundos (ou um novo email na fila) quando a caixa de saída esvazia.
+        """
+        while True:
+            with self.app.app_context():
+                try:
+                    processed = self.send_batch()
+                except Exception as e:
+                    self.app.logger.exception(e)
+                    db.session.rollback()
+                    processed = 0
+
+            if processed: continue
+
+            if self._connection is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+                self.close()
+
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def start(self, interval):
+        if self._thread is not None: return
+
+        with self._lock:
+            if self._thread is not None: return
+
+            self._thread = threading.Thread(target=self.run, args=(interval,), daemon=True)
+            self._thread.start()
+
+
+def init_outbox(app):
+    worker = EmailWorker(app)
+    app.extensions['facilitai_outbox'] = worker
+
+    @app.cli.command('send-emails')
+    def send_emails_command():
+        """Envia os emails pendentes da caixa de saída."""
+        sent = 0
+
+        while True:
+            processed = worker.send_batch()
+            if not processed: break
+            sent += processed
+
+        worker.close()
+        click.echo(f'{sent} emails processados.')
+
+    interval = app.config.get('MAIL_WORKER_INTERVAL', MAIL_WORKER_INTERVAL)
+    if not interval: return
+
+    # o worker é iniciado no primeiro request, já dentro do processo worker
+    @app.before_request
+    def start_email_worker():
+        worker.start(interval)
@@ -0,0 +1,151 @@
+import atexit
+import click
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+
+from concurrent.futures import ProcessPoolExecutor, wait
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from models.stats import LatencyStats
+from conf.config import PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS
+
+
+def normalize_method(method):
+    """
+    Completa o método com os parâmetros padrão do werkzeug, no formato gravado no início
+    do hash: `pbkdf2:sha256` vira `pbkdf2:sha256:260000` e `scrypt`, `scrypt:32768:8:1`.
+    """
+    name, *args = method.split(':')
+
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1] or 0) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+
+    if name == 'scrypt':
+        n, r, p = (int(arg) for arg in args) if len(args) == 3 else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+
+    return method
+
+
+class PasswordHasher:
+    """
+    Gera e verifica hashes de senha fora da thread do request, em um pool de processos.
+
+    O método (algoritmo e custo, no formato do werkzeug, ex.: `pbkdf2:sha256:260000`) vem
+    de PASSWORD_HASH_METHOD. Com PASSWORD_HASH_WORKERS igual a 0 o cálculo é feito na
+    própria thread. O pool é criado no primeiro uso em cada processo, depois de um
+    eventual fork do servidor.
+    """
+
+    def __init__(self, method, workers):
+        self.method = method
+        self.workers = workers
+        self.latency = {'hash': LatencyStats(), 'verify': LatencyStats()}
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    context = multiprocessing.get_context('spawn')
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    self._pid = os.getpid()
+
+        return self._pool
+
+    def _run(self, operation, function, *args):
+        start = time.perf_counter()
+
+        if self.workers:
+            result = self._executor().submit(function, *args).result()
+        else:
+            result = function(*args)
+
+        self.latency[operation].observe(time.perf_counter() - start)
+
+        return result
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, pass_hash, password):
+        return self._run('verify', check_password_hash, pass_hash, password)
+
+    def needs_rehash(self, pass_hash):
+        """
+        Indica se o hash foi gerado com um método (algoritmo ou custo) diferente do atual.
+        """
+        return normalize_method(pass_hash.split('$', 1)[0]) != normalize_method(self.method)
+
+    def start(self):
+        """
+        Sobe os processos do pool, para que o primeiro login não pague a criação deles.
+        """
+        if not self.workers: return
+
+        pool = self._executor()
+        wait([pool.submit(os.getpid) for _ in range(self.workers)])
+
+    def shutdown(self):
+        # o pool herdado de outro processo (antes de um fork) não pertence a este
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown()
+
+        self._pool = None
+
+
+# hashers dos apps vivos: o registro não impede que um app descartado (e o seu pool) seja
+# coletado
+_hashers = weakref.WeakSet()
+
+
+@atexit.register
+def _shutdown_hashers():
+    # encerra os processos dos pools na saída do processo (no gunicorn, do worker)
+    for hasher in list(_hashers):
+        hasher.shutdown()
+
+
+def password_hasher():
+    return current_app.extensions['facilitai_passwords']
+
+
+def hash_password(password):
+    return password_hasher().hash(password)
+
+
+def verify_password(pass_hash, password):
+    return password_hasher().verify(pass_hash, password)
+
+
+def init_passwords(app):
+    hasher = PasswordHasher(
+        app.config.get('PASSWORD_HASH_METHOD', PASSWORD_HASH_METHOD),
+        app.config.get('PASSWORD_HASH_WORKERS', PASSWORD_HASH_WORKERS)
+    )
+    app.extensions['facilitai_passwords'] = hasher
+
+    _hashers.add(hasher)
+
+    @app.cli.command('password-hash-benchmark')
+    @click.option('--method', default=hasher.method, help='Método do werkzeug, ex.: pbkdf2:sha256:260000.')
+    @click.option('--rounds', default=10, help='Quantidade de hashes medidos.')
+    def password_hash_benchmark_command(method, rounds):
+        """Mede a latência do hash de senha neste hardware para ajustar o custo."""
+        latencies = []
+
+        for _ in range(rounds):
+            start = time.perf_counter()
+            generate_password_hash('senha-de-benchmark', method)
+            latencies.append(time.perf_counter() - start)
+
+        latencies.sort()
+        click.echo(f'{method}: mediana {latencies[len(latencies) // 2] * 1000:.1f} ms, máximo {latencies[-1] * 1000:.1f} ms')
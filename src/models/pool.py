@@ -0,0 +1,146 @@
+import os
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+from models.model import db
+from models.stats import LatencyStats
+from conf.config import (
+    DB_POOL_MODE,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING
+)
+
+
+# limites (segundos) dos buckets do histograma de espera por conexão
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool que mede quanto tempo cada checkout espera por uma conexão (incluindo a
+    abertura de conexões de overflow) e quantos checkouts estouram o POOL_TIMEOUT.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_time = LatencyStats(POOL_WAIT_BUCKETS)
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.wait_time.observe(time.perf_counter() - start)
+
+
+def engine_options(config):
+    """
+    Monta as opções do engine a partir da configuração DB_POOL_*.
+
+    No modo `queue` cada worker mantém um TimedQueuePool com DB_POOL_SIZE conexões
+    (mais DB_MAX_OVERFLOW temporárias). No modo `pgbouncer`, para o PgBouncer em
+    transaction pooling, quem guarda as conexões é o PgBouncer: o worker não mantém
+    conexões abertas entre requests e não usa prepared statements do servidor, que não
+    sobrevivem à troca de conexão entre transações. Bancos SQLite usam os padrões do
+    Flask-SQLAlchemy.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+
+    if url.get_backend_name() == 'sqlite': return options
+
+    mode = config.get('DB_POOL_MODE', DB_POOL_MODE)
+    options.setdefault('pool_pre_ping', config.get('DB_POOL_PRE_PING', DB_POOL_PRE_PING))
+
+    if mode == 'pgbouncer':
+        options.setdefault('poolclass', NullPool)
+
+        # psycopg 3 prepara as consultas repetidas no servidor; psycopg2 não
+        if url.get_driver_name() == 'psycopg':
+            options.setdefault('connect_args', {}).setdefault('prepare_threshold', None)
+    elif mode == 'queue':
+        options.setdefault('poolclass', TimedQueuePool)
+        options.setdefault('pool_size', config.get('DB_POOL_SIZE', DB_POOL_SIZE))
+        options.setdefault('max_overflow', config.get('DB_MAX_OVERFLOW', DB_MAX_OVERFLOW))
+        options.setdefault('pool_timeout', config.get('DB_POOL_TIMEOUT', DB_POOL_TIMEOUT))
+        options.setdefault('pool_recycle', config.get('DB_POOL_RECYCLE', DB_POOL_RECYCLE))
+    else:
+        raise ValueError(f'Modo de pool desconhecido: {mode}')
+
+    return options
+
+
+def max_connections(config, workers):
+    """
+    Máximo de conexões que `workers` processos deste nó podem abrir no banco no modo
+    `queue`: workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW). No modo `pgbouncer` e no SQLite
+    o limite fica com o PgBouncer ou não se aplica, e o retorno é None.
+    """
+    if make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'sqlite': return None
+    if config.get('DB_POOL_MODE', DB_POOL_MODE) != 'queue': return None
+
+    return workers * (config.get('DB_POOL_SIZE', DB_POOL_SIZE) + config.get('DB_MAX_OVERFLOW', DB_MAX_OVERFLOW))
+
+
+def pool_stats():
+    """
+    Estado do pool de conexões do worker atual.
+    """
+    pool = db.engine.pool
+    stats = {'pid': os.getpid(), 'pool': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout()
+        })
+
+    if isinstance(pool, TimedQueuePool):
+        stats['timeouts'] = pool.timeouts
+        stats['wait'] = pool.wait_time.to_dict()
+
+    return stats
+
+
+def warm_pool():
+    """
+    Abre as conexões do pool do worker atual antes do primeiro request, para que ele
+    não pague a abertura das conexões. Descarta antes as conexões herdadas do processo
+    pai (com o app pré-carregado, o fork copia o pool do master, e uma conexão não
+    pode ser compartilhada entre processos).
+
+    Returns:
+        A quantidade de conexões abertas.
+    """
+    if not isinstance(db.engine.pool, QueuePool): return 0
+
+    db.engine.dispose(close=False)
+    pool = db.engine.pool
+    connections = []
+
+    try:
+        for _ in range(pool.size()):
+            connections.append(db.engine.connect())
+    finally:
+        for connection in connections: connection.close()
+
+    return len(connections)
+
+
+def init_pool(app):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
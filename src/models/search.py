@@ -0,0 +1,213 @@
+import re
+import threading
+import unicodedata
+
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import DDL, event, case, func, literal, or_
+from sqlalchemy.orm import Session, object_session, with_polymorphic
+
+from models.model import db, Anuncio, AnuncioLivro, AnuncioApartamento
+
+
+# colunas de texto consideradas na busca livre de cada tipo de anúncio
+SEARCH_COLUMNS = {
+    AnuncioLivro: [Anuncio.titulo, Anuncio.descricao, AnuncioLivro.titulo_livro, AnuncioLivro.autor, AnuncioLivro.genero],
+    AnuncioApartamento: [Anuncio.titulo, Anuncio.descricao, AnuncioApartamento.endereco],
+}
+
+_SUBTYPE_ATTRIBUTES = ['titulo_livro', 'autor', 'genero', 'endereco']
+
+
+# índices de trigramas (pg_trgm) aceleram tanto a busca livre quanto os filtros `ilike('%x%')`
+event.listen(
+    db.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+for _column in {column for columns in SEARCH_COLUMNS.values() for column in columns}:
+    db.Index(
+        f'ix_{_column.table.name}_{_column.name}_trgm',
+        _column,
+        postgresql_using='gin',
+        postgresql_ops={_column.name: 'gin_trgm_ops'}
+    ).ddl_if(dialect='postgresql')
+
+
+def tokenize(text):
+    """
+    Normaliza o texto (minúsculas, sem acentos) e separa em palavras.
+    """
+    if not text: return []
+
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+
+    return re.findall(r'\w+', text)
+
+
+class InvertedIndex:
+    """
+    Índice invertido em memória dos textos dos anúncios.
+
+    Usado como alternativa aos índices de trigramas quando o banco não é o PostgreSQL
+    (SQLite em testes e desenvolvimento). É carregado do banco na primeira busca e
+    mantido atualizado pelas escritas do ORM, aplicadas no commit.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self):
+        with self._lock:
+            if self.loaded: return
+
+            for anuncio in db.session.query(with_polymorphic(Anuncio, '*')):
+                self._add(anuncio.id, document_text(anuncio))
+
+            self.loaded = True
+
+    def reset(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self.loaded = False
+
+    def add(self, anuncio_id, text):
+        with self._lock:
+            self._remove(anuncio_id)
+            self._add(anuncio_id, text)
+
+    def remove(self, anuncio_id):
+        with self._lock:
+            self._remove(anuncio_id)
+
+    def search(self, termo):
+        """
+        Devolve um dicionário {id do anúncio: relevância} para os anúncios que contêm
+        alguma palavra do termo. A relevância é a fração das palavras do termo encontradas.
+        """
+        self.load()
+
+        tokens = set(tokenize(termo))
+        scores = defaultdict(float)
+
+        with self._lock:
+            for token in tokens:
+                for anuncio_id in self._postings.get(token, {}):
+                    scores[anuncio_id] += 1 / len(tokens)
+
+        return dict(scores)
+
+    def _add(self, anuncio_id, text):
+        tokens = tokenize(text)
+        self._documents[anuncio_id] = set(tokens)
+
+        for token in tokens:
+            self._postings[token][anuncio_id] = self._postings[token].get(anuncio_id, 0) + 1
+
+    def _remove(self, anuncio_id):
+        for token in self._documents.pop(anuncio_id, ()):
+            postings = self._postings.get(token)
+            postings.pop(anuncio_id, None)
+            if not postings: del self._postings[token]
+
+
+def document_text(anuncio):
+    """
+    Junta os textos pesquisáveis de um anúncio, incluindo as colunas do subtipo.
+    """
+    parts = [anuncio.titulo, anuncio.descricao]
+    parts += [getattr(anuncio, attribute, None) for attribute in _SUBTYPE_ATTRIBUTES]
+
+    return ' '.join(part for part in parts if part)
+
+
+def reset_search_index():
+    """
+    Descarta o índice invertido, que é recarregado na próxima busca. Usado após
+    escritas em lote, que não disparam os eventos do ORM.
+    """
+    index = current_app.extensions.get('facilitai_search')
+    if index: index.reset()
+
+
+def init_search(app):
+    app.extensions['facilitai_search'] = InvertedIndex()
+
+
+def _inverted_index():
+    index = current_app.extensions.get('facilitai_search') if current_app else None
+
+    if index is None or not index.loaded: return None
+
+    return index
+
+
+def _pending_changes(target):
+    session = object_session(target)
+    return session.info.setdefault('facilitai_search_changes', {}) if session is not None else None
+
+
+# as escritas só chegam ao índice depois do commit: um rollback não deixa entradas fantasmas
+@event.listens_for(Anuncio, 'after_insert', propagate=True)
+@event.listens_for(Anuncio, 'after_update', propagate=True)
+def _index_anuncio(mapper, connection, target):
+    changes = _pending_changes(target)
+    if changes is not None and _inverted_index(): changes[target.id] = document_text(target)
+
+
+@event.listens_for(Anuncio, 'after_delete', propagate=True)
+def _unindex_anuncio(mapper, connection, target):
+    changes = _pending_changes(target)
+    if changes is not None and _inverted_index(): changes[target.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_index_changes(session):
+    changes = session.info.pop('facilitai_search_changes', None)
+    index = _inverted_index() if changes else None
+
+    if index is None: return
+
+    for anuncio_id, text in changes.items():
+        if text is None:
+            index.remove(anuncio_id)
+        else:
+            index.add(anuncio_id, text)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_index_changes(session):
+    session.info.pop('facilitai_search_changes', None)
+
+
+def text_search(query, model, termo):
+    """
+    Aplica a busca livre `termo` sobre os textos do anúncio e do subtipo `model`.
+
+    No PostgreSQL usa similaridade de trigramas (operador `<%` do pg_trgm, atendido pelos
+    índices GIN); nos demais bancos usa o índice invertido em memória.
+
+    Returns:
+        A consulta filtrada e a expressão de relevância de cada anúncio.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        columns = SEARCH_COLUMNS[model]
+        termo = literal(termo, db.String)
+
+        query = query.filter(or_(*[termo.op('<%')(column) for column in columns]))
+        rank = func.greatest(*[func.coalesce(func.word_similarity(termo, column), 0) for column in columns])
+
+        return query, db.cast(rank, db.Float)
+
+    scores = current_app.extensions['facilitai_search'].search(termo)
+
+    query = query.filter(model.id.in_(scores.keys()))
+    rank = case(scores, value=model.id, else_=0.0) if scores else literal(0.0)
+
+    return query, db.cast(rank, db.Float)
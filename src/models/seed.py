@@ -0,0 +1,297 @@
+import click
+import csv
+import io
+import itertools
+import random
+import time
+import uuid
+
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import func, select, text
+
+from models.model import db, User, Anuncio, AnuncioLivro, AnuncioApartamento, Favorites, TokenBlockList, StatusAnuncio
+from models.passwords import hash_password
+from models.search import reset_search_index
+from models.migrations import migrate
+
+
+NOMES = ('ana', 'bruno', 'carla', 'diego', 'elisa', 'felipe', 'gabriela', 'heitor', 'isabela', 'joao',
+         'karina', 'lucas', 'mariana', 'nicolas', 'olivia', 'pedro', 'rafaela', 'samuel', 'tatiana', 'vitor')
+CAMPI = {'CG': 70, 'Patos': 10, 'Sousa': 8, 'Cajazeiras': 7, 'Pombal': 5}
+CURSOS = {'CC': 25, 'EE': 15, 'Medicina': 10, 'Direito': 15, 'Engenharia Civil': 15, 'Letras': 10, 'Física': 10}
+GENEROS = {'Didático': 30, 'Ficção': 20, 'Romance': 12, 'Fantasia': 10, 'Biografia': 8, 'Terror': 6, 'Poesia': 5, 'Drama': 9}
+STATUS = {StatusAnuncio.AGUARDANDO_ACAO.name: 80, StatusAnuncio.VENDIDO.name: 10, StatusAnuncio.TROCADO.name: 5, StatusAnuncio.DOADO.name: 5}
+COMODOS = {1: 30, 2: 35, 3: 20, 4: 10, 5: 5}
+PALAVRAS = ('cálculo', 'física', 'química', 'história', 'algoritmos', 'direito', 'anatomia', 'clássico',
+            'coleção', 'volume', 'edição', 'introdução', 'avançado', 'guia', 'manual', 'contos')
+RUAS = ('Rua Aprígio Veloso', 'Rua Rodrigues Alves', 'Av. Floriano Peixoto', 'Rua Paulino Raposo',
+        'Rua Juvêncio Arruda', 'Av. Canal', 'Rua Treze de Maio', 'Rua Vigário Calixto')
+
+# limite de parâmetros por INSERT de várias linhas (o SQLite aceita até 32766)
+MAX_INSERT_PARAMS = 30000
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def _zipf_weights(count, exponent=1.1):
+    """
+    Pesos de popularidade no formato da lei de Zipf: poucos itens concentram a maior
+    parte das escolhas, como anunciantes frequentes e anúncios muito favoritados.
+    """
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+class BulkLoader:
+    """
+    Carrega linhas em uma tabela em lotes, com COPY no PostgreSQL (psycopg2 ou psycopg 3)
+    ou com INSERTs de várias linhas nos demais bancos.
+    """
+
+    def __init__(self, connection, batch_size, method='auto'):
+        self.connection = connection
+        self.batch_size = batch_size
+
+        if method == 'auto':
+            method = 'copy' if connection.dialect.name == 'postgresql' else 'insert'
+
+        self.method = method
+
+    def load(self, table, rows):
+        columns = [column.name for column in table.columns]
+        batch_size = self.batch_size
+
+        if self.method == 'insert':
+            batch_size = max(min(batch_size, MAX_INSERT_PARAMS // len(columns)), 1)
+
+        count = 0
+        batch = list(itertools.islice(rows, batch_size))
+
+        while batch:
+            if self.method == 'copy':
+                self._copy(table, columns, batch)
+            else:
+                self.connection.execute(table.insert().values(batch))
+
+            count += len(batch)
+            batch = list(itertools.islice(rows, batch_size))
+
+        return count
+
+    def _copy(self, table, columns, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for row in batch:
+            writer.writerow([row.get(column) for column in columns])
+
+        buffer.seek(0)
+
+        statement = f'COPY {self.connection.dialect.identifier_preparer.format_table(table)} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+        cursor = self.connection.connection.driver_connection.cursor()
+
+        try:
+            if hasattr(cursor, 'copy_expert'):
+                cursor.copy_expert(statement, buffer)
+            else:
+                with cursor.copy(statement) as copy:
+                    copy.write(buffer.getvalue())
+        finally:
+            cursor.close()
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def generate_users(first_id, count, pass_hash, rng, username_prefix=''):
+    for user_id in range(first_id, first_id + count):
+        nome = rng.choice(NOMES)
+
+        yield {
+            'id': user_id,
+            'username': f'{username_prefix}{nome}.{user_id}',
+            'email': f'{nome}.{user_id}@estudante.ufcg.edu.br',
+            'matricula': str(100000000 + user_id),
+            'pass_hash': pass_hash,
+            'campus': _weighted(rng, CAMPI),
+            'curso': _weighted(rng, CURSOS),
+            'rating': None,
+            'profile_img': None
+        }
+
+
+def generate_ads(first_id, books, apartments, user_ids, rng, images=()):
+    """
+    Gera os anúncios em três fluxos de linhas: a tabela base e as tabelas de livros e de
+    apartamentos (herança por tabelas ligadas).
+
+    Os anunciantes seguem uma distribuição de Zipf e os preços, log-normais (livros em
+    torno de R$ 30, aluguéis em torno de R$ 1.000).
+    """
+    if (books or apartments) and not user_ids:
+        raise ValueError('É preciso ao menos um usuário para gerar anúncios.')
+
+    weights = _zipf_weights(len(user_ids))
+    base, livros, apartamentos = [], [], []
+
+    for offset in range(books + apartments):
+        anuncio_id = first_id + offset
+        is_book = offset < books
+        palavras = ' '.join(rng.sample(PALAVRAS, 3))
+
+        base.append({
+            'id': anuncio_id,
+            'titulo': (f'Livro de {palavras}' if is_book else f'Apartamento {rng.choice(("mobiliado", "próximo à UFCG", "amplo", "reformado"))}')[:70],
+            'descricao': (f'Anúncio {anuncio_id}: {palavras}. ' * rng.randint(1, 8))[:500],
+            'preco': round(rng.lognormvariate(3.4, 0.6) if is_book else rng.lognormvariate(6.9, 0.35), 2),
+            'status': _weighted(rng, STATUS),
+            'user_id': rng.choices(user_ids, cum_weights=weights)[0],
+            'ad_img': images[anuncio_id % len(images)] if images else None,
+            'type_discriminator': 'anuncio_livro' if is_book else 'anuncio_apartamento'
+        })
+
+        if is_book:
+            livros.append({
+                'id': anuncio_id,
+                'titulo_livro': palavras[:20],
+                'autor': f'{rng.choice(NOMES).title()} {rng.choice(NOMES).title()}'[:20],
+                'genero': _weighted(rng, GENEROS),
+                'aceita_trocas': rng.random() < 0.3
+            })
+        else:
+            comodos = _weighted(rng, COMODOS)
+            apartamentos.append({
+                'id': anuncio_id,
+                'endereco': f'{rng.choice(RUAS)}, {anuncio_id}'[:70],
+                'area': int(15 + comodos * max(rng.gauss(18, 4), 8)),
+                'comodos': comodos
+            })
+
+    return base, livros, apartamentos
+
+
+def generate_favorites(first_id, count, user_ids, ad_ids, rng):
+    """
+    Gera favoritos distintos por (usuário, anúncio), com anúncios populares (Zipf)
+    concentrando a maior parte dos favoritos.
+    """
+    if not user_ids or not ad_ids: return
+
+    popularity = _zipf_weights(len(ad_ids))
+    count = min(count, len(user_ids) * len(ad_ids))
+    seen = set()
+    favorite_id = first_id
+
+    while len(seen) < count:
+        pair = (rng.choice(user_ids), rng.choices(ad_ids, cum_weights=popularity)[0])
+
+        if pair in seen: continue
+
+        seen.add(pair)
+        yield {'id': favorite_id, 'user_id': pair[0], 'anuncio_id': pair[1]}
+        favorite_id += 1
+
+
+def generate_revoked_tokens(first_id, count, max_age, rng):
+    """
+    Gera JTIs revogados com datas espalhadas em duas vezes a validade dos tokens: cerca
+    de metade já expirou e é removida pela limpeza da TokenBlockList.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    for token_id in range(first_id, first_id + count):
+        yield {
+            'id': token_id,
+            'jti': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'created_at': now - timedelta(seconds=rng.uniform(0, 2 * max_age.total_seconds()))
+        }
+
+
+def reset_sequences():
+    """
+    Ajusta as sequências do PostgreSQL depois de uma carga com IDs explícitos.
+    """
+    if db.engine.dialect.name != 'postgresql': return
+
+    for model in (User, Anuncio, Favorites, TokenBlockList):
+        table = model.__table__.name
+        db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))"))
+
+
+def load_synthetic_data(users, books, apartments, favorites, revoked_tokens, batch_size=5000, method='auto',
+                        random_seed=0, password='12345678', username_prefix='', images=(), log=None):
+    """
+    Gera e carrega dados sintéticos em massa, com IDs explícitos a partir dos já existentes.
+    Deve ser chamada dentro de um app context, com as tabelas criadas.
+
+    Returns:
+        Os IDs dos usuários, dos livros e dos apartamentos criados.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    loader = BulkLoader(db.session.connection(), batch_size, method)
+
+    def timed(name, table, rows):
+        start = time.perf_counter()
+        count = loader.load(table, iter(rows))
+        log(f'{name}: {count} linhas em {time.perf_counter() - start:.1f} s ({loader.method})')
+
+    first_user = _next_id(User)
+    user_ids = list(range(first_user, first_user + users))
+
+    # o hash é caro de propósito: todos os usuários gerados compartilham a mesma senha
+    timed('user', User.__table__, generate_users(first_user, users, hash_password(password), rng, username_prefix))
+
+    first_ad = _next_id(Anuncio)
+    advertisers = user_ids or db.session.scalars(select(User.id).order_by(User.id)).all()
+    base, livros, apartamentos = generate_ads(first_ad, books, apartments, advertisers, rng, images)
+
+    timed('anuncio', Anuncio.__table__, base)
+    timed('anuncio_livro', AnuncioLivro.__table__, livros)
+    timed('anuncio_apartamento', AnuncioApartamento.__table__, apartamentos)
+
+    ad_ids = [row['id'] for row in base]
+    timed('favorites', Favorites.__table__, generate_favorites(_next_id(Favorites), favorites, advertisers, ad_ids, rng))
+
+    max_age = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    timed('token_block_list', TokenBlockList.__table__, generate_revoked_tokens(_next_id(TokenBlockList), revoked_tokens, max_age, rng))
+
+    reset_sequences()
+    db.session.commit()
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+    reset_search_index()
+
+    return {
+        'user_ids': user_ids,
+        'book_ids': [row['id'] for row in livros],
+        'apartment_ids': [row['id'] for row in apartamentos]
+    }
+
+
+def init_seed(app):
+
+    @app.cli.command('seed-data')
+    @click.option('--users', default=10000, help='Quantidade de usuários.')
+    @click.option('--books', default=100000, help='Quantidade de anúncios de livros.')
+    @click.option('--apartments', default=25000, help='Quantidade de anúncios de apartamentos.')
+    @click.option('--favorites', default=200000, help='Quantidade de favoritos.')
+    @click.option('--revoked-tokens', default=20000, help='Quantidade de tokens revogados.')
+    @click.option('--batch-size', default=5000, help='Linhas por lote de COPY ou INSERT.')
+    @click.option('--method', type=click.Choice(['auto', 'copy', 'insert']), default='auto', help='COPY (PostgreSQL) ou INSERTs de várias linhas.')
+    @click.option('--seed', 'random_seed', default=0, help='Semente do gerador, para cargas reproduzíveis.')
+    @click.option('--password', default='12345678', help='Senha de todos os usuários gerados.')
+    def seed_data_command(users, books, apartments, favorites, revoked_tokens, batch_size, method, random_seed, password):
+        """Gera dados sintéticos em massa para reproduzir problemas de escala."""
+        migrate()
+
+        start = time.perf_counter()
+        load_synthetic_data(users, books, apartments, favorites, revoked_tokens, batch_size, method,
+                            random_seed, password, log=click.echo)
+        click.echo(f'Carga concluída em {time.perf_counter() - start:.1f} s.')
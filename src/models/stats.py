@@ -0,0 +1,37 @@
+import threading
+
+
+# limites (segundos) dos buckets do histograma de latência
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class LatencyStats:
+    """
+    Histograma acumulado da latência de uma operação.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound: self.counts[i] += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'total': self.total,
+                'max': self.max,
+                'buckets': dict(zip(self.buckets, self.counts))
+            }
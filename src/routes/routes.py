@@ -1,11 +1,8 @@
-import uuid
-
-from pathlib import Path
-from flask import Blueprint, request, jsonify, abort, url_for, send_file
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from flask import Blueprint, request, jsonify, abort, url_for, current_app
 from flask_jwt_extended import create_access_token, current_user, jwt_required, JWTManager, get_jwt
 from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from dataclasses import asdict
 import json
 
@@ -18,24 +15,61 @@ from models.model import (
     AnuncioApartamento,
     Anuncio,
     StatusAnuncio,
-    TokenBlockList
+    TokenBlockList,
+    Favorites
 )
 from conf.config import (
     REGISTER,
     LOGIN,
     LOGOUT,
     CREATE_AD,
+    CREATE_ADS,
+    CREATE_ADS_MAX,
     UPDATE,
     DELETE_AD,
     EDIT_AD,
     UPLOAD_IMG_AD,
     UPLOAD_PROFILE_IMG,
-    IMAGE_PATH,
     IMAGE,
     FAV_AD,
     GET_FAV_ADS,
+    FAV_ADS,
+    FAV_BULK_MAX,
     SEARCH_BOOKS,
-    SEARCH_APARTMENTS
+    SEARCH_APARTMENTS,
+    SEARCH_BOOKS_FACETS,
+    SEARCH_APARTMENTS_FACETS,
+    COMPRESS_SEARCH_LEVEL,
+    POOL_STATS,
+    POOL_STATS_ENABLED,
+    METRICS,
+    METRICS_ENABLED,
+    JWT_CACHE_TTL,
+    JWT_CACHE_SIZE
+)
+from models.cache import TTLCache, snapshot, restore
+from models.blocklist import revoked_tokens
+from models.images import store_image, release_image, image_file
+from models.search import text_search, reset_search_index
+from models.passwords import hash_password, verify_password, password_hasher
+from models.pool import pool_stats
+from main.compression import compression_level
+from main.metrics import exposition
+from routes.utils import (
+    listing_response,
+    image_response,
+    insert_ignoring_conflicts,
+    parse_ad,
+    conflicting_field,
+    cached_search,
+    invalidate_search_cache,
+    facet_counts,
+    price_histogram,
+    parse_fields,
+    parse_stream,
+    field_projection,
+    anuncio_query,
+    get_anuncio
 )
 
 bp = Blueprint('bp', __name__, template_folder='templates', url_prefix='')
@@ -44,6 +78,14 @@ bp = Blueprint('bp', __name__, template_folder='templates', url_prefix='')
 def init_jwt(app):
     jwt = JWTManager(app)
 
+    # caches das consultas feitas antes de todo endpoint autenticado
+    ttl = app.config.get('JWT_CACHE_TTL', JWT_CACHE_TTL)
+    size = app.config.get('JWT_CACHE_SIZE', JWT_CACHE_SIZE)
+    app.extensions['facilitai_jwt_cache'] = {
+        'users': TTLCache(size, ttl),
+        'revoked': TTLCache(size, ttl)
+    }
+
     @jwt.user_identity_loader
     def user_identity_lookup(user):
         return user.username
@@ -51,14 +93,53 @@ def init_jwt(app):
     @jwt.user_lookup_loader
     def user_lookup_callback(_jwt_header, jwt_data):
         username = jwt_data["sub"]
-        return User.query.filter_by(username=username).one_or_none()
+        users = jwt_cache()['users']
+
+        cached = users.get(username)
+        if cached is not None: return restore(User, cached)
+
+        user = User.query.filter_by(username=username).one_or_none()
+        if user: users.set(username, snapshot(user))
+
+        return user
 
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         jti = jwt_payload['jti']
-        token = TokenBlockList.query.filter_by(jti=jti).scalar()
 
-        return token is not None
+        # tokens fora do filtro de Bloom certamente não foram revogados
+        if not revoked_tokens().might_be_revoked(jti): return False
+
+        revoked_cache = jwt_cache()['revoked']
+
+        if revoked_cache.get(jti): return True
+
+        # só as revogações ficam em cache: um falso positivo do filtro que for revogado
+        # depois, em outro worker, precisa ser recusado já na próxima sincronização
+        revoked = TokenBlockList.query.filter_by(jti=jti).scalar() is not None
+        if revoked: revoked_cache.set(jti, True)
+
+        return revoked
+
+
+def jwt_cache():
+    return current_app.extensions['facilitai_jwt_cache']
+
+
+def invalidate_cached_user(*usernames):
+    """
+    Descarta os dados em cache dos usuários, após qualquer alteração no cadastro.
+    """
+    for username in usernames:
+        jwt_cache()['users'].invalidate(username)
+
+
+# mensagens de conflito no registro, por campo com restrição única
+_REGISTER_CONFLICTS = {
+    'username': 'Esse usuario já está cadastrado no sistema.',
+    'email': 'Esse e-mail já está cadastrado no sistema.',
+    'matricula': 'Essa matrícula já está cadastrado no sistema.'
+}
 
 
 @bp.route(REGISTER, methods=['POST'])
@@ -88,20 +169,17 @@ def register():
     if len(matricula) != 9:
         abort(400, 'Matricula Inválida')
 
-    # Verifica se o nome de usuário, email ou matrícula já estão em uso por outro usuário
-    if User.query.filter_by(username=username).first():
-        abort(409, 'Esse usuario já está cadastrado no sistema.')
-
-    if User.query.filter_by(email=email).first():
-        abort(409, 'Esse e-mail já está cadastrado no sistema.')
-
-    if User.query.filter_by(matricula=matricula).first():
-        abort(409, 'Essa matrícula já está cadastrado no sistema.')
-
-    # Cria o novo usuário e salva no banco de dados
-    new_user = User(username, email, matricula, campus, generate_password_hash(password), curso)
+    # Cria o novo usuário e salva no banco de dados. As restrições únicas de nome de
+    # usuário, email e matrícula detectam cadastros repetidos, inclusive concorrentes
+    new_user = User(username, email, matricula, campus, hash_password(password), curso)
     db.session.add(new_user)
-    db.session.commit()
+
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        field = conflicting_field(e, _REGISTER_CONFLICTS)
+        abort(409, _REGISTER_CONFLICTS.get(field, 'Esse usuario já está cadastrado no sistema.'))
 
     # Retorna a mensagem de sucesso com o código 201
     return jsonify(message='Usuário cadastrado com sucesso.'), 201
@@ -119,48 +197,94 @@ def create_ad():
         BadRequest: Se algum dos campos necessários não for fornecido.
         Unauthorized: Se o usuário não estiver logado.
     """
-    titulo = request.json.get("titulo", None)
-    descricao = request.json.get("descricao", None)
-    preco = float(request.json.get("preco", None))
-    categoria = request.json.get("categoria", None)
-    # imagens = request.files.getlist('imagens')
     anunciante = current_user
     status = StatusAnuncio.AGUARDANDO_ACAO
 
-    if not categoria: abort(400, 'Categoria é necessária.')
     if not anunciante: abort(401, 'O usuário precisa estar logado.')
 
-    if categoria == 'livro':
-        titulo_livro = request.json.get('tituloLivro', None)
-        autor = request.json.get('autor', None)
-        genero = request.json.get('genero', None)
-        aceita_trocas = request.json.get('aceitaTroca', False)
+    try:
+        model, fields = parse_ad(request.json)
+    except ValueError as e:
+        abort(400, str(e))
 
-        if not all([titulo, descricao, preco, titulo_livro, genero, autor]): abort(400, 'Todos os campos precisam ser preenchidos.')
-
-        anuncio = AnuncioLivro(titulo, anunciante, descricao, preco, status, titulo_livro, autor, genero, bool(aceita_trocas)) 
-        
-        db.session.add(anuncio)
-        db.session.commit()
+    anuncio = model(anunciante=anunciante, status=status, **fields)
 
-    elif categoria == 'apartamento':
-        endereco = request.json.get('endereco', None)
-        area = int(request.json.get('area', None))
-        comodos = int(request.json.get('comodos', None))
-
-        if not all([titulo, descricao, preco, endereco, area, comodos]): abort(400,
-                                                                               'Todos os campos precisam ser preenchidos.')
-        anuncio = AnuncioApartamento(titulo, anunciante, descricao, preco, status, endereco, area, comodos)
-        
-        db.session.add(anuncio)
-        db.session.commit()
-    
-    else: 
-        abort(400, 'Não existem anuncios dessa categoria')
+    db.session.add(anuncio)
+    db.session.commit()
+    invalidate_search_cache()
 
     return jsonify(message='Anúncio criado.', ad_id=anuncio.id), 201
 
 
+@bp.route(CREATE_ADS, methods=['POST'])
+@jwt_required()
+def create_ads():
+    """Cria vários anúncios, de livros e de apartamentos, em uma única transação.
+
+    O corpo da requisição deve conter `anuncios`, uma lista de anúncios no mesmo formato
+    aceito na criação de um anúncio. Todos os anúncios são validados antes da inserção;
+    se algum for inválido, nenhum é criado.
+
+    Returns:
+        Um objeto JSON com os IDs dos anúncios criados, na ordem enviada, e código 201.
+
+    Raises:
+        BadRequest: Se algum anúncio for inválido, com a lista de erros por item.
+        Unauthorized: Se o usuário não estiver logado.
+    """
+    anunciante = current_user
+    anuncios = request.json.get('anuncios', None)
+
+    if not anunciante: abort(401, 'O usuário precisa estar logado.')
+    if not isinstance(anuncios, list) or not anuncios: abort(400, 'O campo anuncios deve ser uma lista de anúncios.')
+    if len(anuncios) > CREATE_ADS_MAX: abort(400, f'No máximo {CREATE_ADS_MAX} anúncios por requisição.')
+
+    parsed, erros = [], []
+
+    for indice, payload in enumerate(anuncios):
+        try:
+            parsed.append(parse_ad(payload))
+        except ValueError as e:
+            erros.append({'indice': indice, 'erro': str(e)})
+            parsed.append((None, None))
+
+    # endereços de apartamento são únicos: verifica repetições no lote e no banco com uma consulta
+    enderecos = [fields['endereco'] for model, fields in parsed if model is AnuncioApartamento]
+    existentes = {endereco for endereco, in db.session.query(AnuncioApartamento.endereco).filter(AnuncioApartamento.endereco.in_(enderecos))}
+    vistos = set()
+
+    for indice, (model, fields) in enumerate(parsed):
+        if model is not AnuncioApartamento: continue
+
+        if fields['endereco'] in existentes or fields['endereco'] in vistos:
+            erros.append({'indice': indice, 'erro': 'Já existe um anúncio para esse endereço.'})
+
+        vistos.add(fields['endereco'])
+
+    if erros:
+        erros.sort(key=lambda erro: erro['indice'])
+        return jsonify(message='Nenhum anúncio foi criado.', erros=erros), 400
+
+    ad_ids = [None] * len(parsed)
+
+    # um INSERT em lote por tipo de anúncio, todos na mesma transação
+    for model in (AnuncioLivro, AnuncioApartamento):
+        indices = [indice for indice, (parsed_model, fields) in enumerate(parsed) if parsed_model is model]
+        if not indices: continue
+
+        rows = [dict(parsed[indice][1], user_id=anunciante.id, status=StatusAnuncio.AGUARDANDO_ACAO.name) for indice in indices]
+        ids = db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+
+        for indice, ad_id in zip(indices, ids):
+            ad_ids[indice] = ad_id
+
+    db.session.commit()
+    reset_search_index()
+    invalidate_search_cache()
+
+    return jsonify(message='Anúncios criados.', ad_ids=ad_ids), 201
+
+
 @bp.route(EDIT_AD, methods=['PUT'])
 @jwt_required()
 def edit_ad():
@@ -177,7 +301,7 @@ def edit_ad():
         NotFound: Se o anúncio não for encontrado.
         Unauthorized: Se o usuário não estiver autorizado a editar o anúncio.
     """
-    anuncio = Anuncio.query.get(request.json.get('id_anuncio'))
+    anuncio = get_anuncio(request.json.get('id_anuncio'))
 
     if not anuncio: abort(404, 'Anúncio não encontrado')
     if anuncio.anunciante != current_user: abort(401, 'Usuário não autorizado para editar este anúncio')
@@ -217,6 +341,7 @@ def edit_ad():
         abort(400, 'Não existem anuncios dessa categoria')
 
     db.session.commit()
+    invalidate_search_cache()
 
     return jsonify(message="Anúncio editado com sucesso"), 200
 
@@ -235,7 +360,13 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and check_password_hash(user.pass_hash, password):
+    if user and verify_password(user.pass_hash, password):
+        # refaz o hash gerado com algoritmo ou custo antigos, aproveitando a senha em claro
+        if password_hasher().needs_rehash(user.pass_hash):
+            user.pass_hash = hash_password(password)
+            db.session.commit()
+            invalidate_cached_user(user.username)
+
         access_token = create_access_token(identity=user)
         return jsonify(message="Logado com sucesso", access_token=access_token)
 
@@ -276,6 +407,8 @@ def update_user():
     if existing_username_user and existing_username_user != user:
         abort(409, 'Nome de usuário indisponível.')
 
+    old_username = user.username
+
     # Atualiza as informações do usuário com as novas informações, se elas foram fornecidas
     if new_username:
         user.username = new_username
@@ -284,25 +417,30 @@ def update_user():
         user.campus = new_campus
 
     if new_password:
-        user.pass_hash = generate_password_hash(new_password)
+        user.pass_hash = hash_password(new_password)
 
     if new_curso:
         user.curso = new_curso
 
     db.session.commit()
+    invalidate_cached_user(old_username, user.username)
+    invalidate_search_cache()
 
     return jsonify(message='Usuário atualizado com sucesso.'), 204
 
 
-@bp.route(SEARCH_BOOKS, methods=['POST'])
-def search_books():
+def filter_books(query, filters):
+    """
+    Aplica os filtros da busca de livros à consulta.
 
-    # Iniciar com uma consulta base para recuperar os anúncios de livros
-    query = AnuncioLivro.query
-    filters = request.json
+    Returns:
+        A consulta filtrada e a expressão de relevância da busca por termo (ou None).
+    """
+    rank = None
 
     # Obter os parâmetros de consulta da requisição
     if filters:
+        termo = filters.get('termo', None)
         nome_livro = filters.get('nome_livro', None)
         nome_autor = filters.get('nome_autor', None)
         genero = filters.get('genero', None)
@@ -312,6 +450,9 @@ def search_books():
 
 
         # Aplicar filtros com base nos critérios do usuário
+        if termo:
+            query, rank = text_search(query, AnuncioLivro, termo)
+
         if nome_livro:
             query = query.filter(AnuncioLivro.titulo_livro.ilike(f'%{nome_livro}%'))
 
@@ -330,37 +471,28 @@ def search_books():
         if aceita_trocas:
             query = query.filter(AnuncioLivro.aceita_trocas == aceita_trocas)
 
-    # Executar a consulta e recuperar os anúncios de livros filtrados
-    resultados = query.all()
+    return query, rank
 
-    # Serializar cada anúncio de livro nos resultados e remover dados de anunciante
-    livros_serial = [livro.get_to_dict() for livro in resultados]
 
-    return jsonify(livros_serial)
-
-
-@bp.route(SEARCH_APARTMENTS, methods=['POST'])
-def search_apartments():
-    """Realiza a filtragem de imóveis anunciados com base nos filtros fornecidos no JSON.
-
-    O corpo da requisição pode conter um JSON com os seguintes campos opcionais:
-        - endereco: Filtra por endereco do imóvel.
-        - valor_min: Filtra por valor mínimo do imóvel.
-        - valor_max: Filtra por valor máximo do imóvel.
-        - num_comodos: Filtra por número de comodos do imóvel.
+def filter_apartments(query, filters):
+    """
+    Aplica os filtros da busca de imóveis à consulta.
 
     Returns:
-        Uma lista de imóveis filtrados em formato JSON.
+        A consulta filtrada e a expressão de relevância da busca por termo (ou None).
     """
-    filters = request.json
-    query = AnuncioApartamento.query
+    rank = None
 
     if filters:
+        termo = filters.get('termo', None)
         endereco = filters.get('endereco', None)
         valor_min = filters.get('valor_min', None)
         valor_max = filters.get('valor_max', None)
         num_comodos = filters.get('num_comodos', None)
 
+        if termo:
+            query, rank = text_search(query, AnuncioApartamento, termo)
+
         if endereco:
             query = query.filter(AnuncioApartamento.endereco.ilike(f'%{endereco}%'))
 
@@ -373,11 +505,99 @@ def search_apartments():
         if num_comodos:
             query = query.filter(AnuncioApartamento.comodos >= int(num_comodos))
 
-    lista_apartamentos = query.all()
+    return query, rank
+
+
+@bp.route(SEARCH_BOOKS, methods=['POST'])
+@compression_level(COMPRESS_SEARCH_LEVEL)
+@cached_search
+def search_books():
+
+    # Iniciar com uma consulta base para recuperar os anúncios de livros, lendo apenas os campos pedidos
+    filters = request.json
+    options, serialize = field_projection(AnuncioLivro, parse_fields((filters or {}).get('fields', None), AnuncioLivro), stream=parse_stream(filters))
+    query, rank = filter_books(AnuncioLivro.query.options(*options), filters)
+
+    # Executar a consulta paginada e serializar cada anúncio sem dados de anunciante
+    return listing_response(query, AnuncioLivro.id, filters, serialize, rank)
+
+
+@bp.route(SEARCH_APARTMENTS, methods=['POST'])
+@compression_level(COMPRESS_SEARCH_LEVEL)
+@cached_search
+def search_apartments():
+    """Realiza a filtragem de imóveis anunciados com base nos filtros fornecidos no JSON.
+
+    O corpo da requisição pode conter um JSON com os seguintes campos opcionais:
+        - termo: Busca livre no título, descrição e endereço, ordenada por relevância.
+        - endereco: Filtra por endereco do imóvel.
+        - valor_min: Filtra por valor mínimo do imóvel.
+        - valor_max: Filtra por valor máximo do imóvel.
+        - num_comodos: Filtra por número de comodos do imóvel.
+        - limit: Tamanho máximo da página de resultados.
+        - after: Cursor devolvido no header X-Next-Cursor da página anterior.
+        - stream: Se verdadeiro, escreve os resultados à medida que são lidos do banco.
+        - fields: Lista dos campos de cada imóvel a devolver (por padrão, todos).
+
+    Returns:
+        Uma lista de imóveis filtrados em formato JSON.
+    """
+    filters = request.json
+    options, serialize = field_projection(AnuncioApartamento, parse_fields((filters or {}).get('fields', None), AnuncioApartamento), stream=parse_stream(filters))
+    query, rank = filter_apartments(AnuncioApartamento.query.options(*options), filters)
+
+    return listing_response(query, AnuncioApartamento.id, filters, serialize, rank)
+
+
+@bp.route(SEARCH_BOOKS_FACETS, methods=['POST'])
+@compression_level(COMPRESS_SEARCH_LEVEL)
+@cached_search
+def search_books_facets():
+    """Conta os livros anunciados que atendem aos filtros, para montar os filtros da busca.
+
+    Aceita os mesmos filtros de `search_books` e, opcionalmente, `faixas_preco`, a
+    quantidade de faixas do histograma de preços. As contagens são feitas no banco,
+    sem carregar os anúncios.
 
-    apartamentos_json = [apartamento.get_to_dict() for apartamento in lista_apartamentos]
+    Returns:
+        Um objeto JSON com o total, as contagens por gênero, por aceitação de trocas e
+        por status, e o histograma de preços.
+    """
+    filters = request.json
+    query, _ = filter_books(AnuncioLivro.query, filters)
+    preco = price_histogram(query, AnuncioLivro.preco, filters)
+
+    return jsonify(
+        total=sum(faixa['quantidade'] for faixa in preco['faixas']),
+        genero=facet_counts(query, AnuncioLivro.genero),
+        aceita_trocas=facet_counts(query, AnuncioLivro.aceita_trocas),
+        status=facet_counts(query, AnuncioLivro.status),
+        preco=preco
+    )
+
+
+@bp.route(SEARCH_APARTMENTS_FACETS, methods=['POST'])
+@compression_level(COMPRESS_SEARCH_LEVEL)
+@cached_search
+def search_apartments_facets():
+    """Conta os imóveis anunciados que atendem aos filtros, para montar os filtros da busca.
+
+    Aceita os mesmos filtros de `search_apartments` e, opcionalmente, `faixas_preco`.
+
+    Returns:
+        Um objeto JSON com o total, as contagens por número de cômodos e por status, e
+        o histograma de preços.
+    """
+    filters = request.json
+    query, _ = filter_apartments(AnuncioApartamento.query, filters)
+    preco = price_histogram(query, AnuncioApartamento.preco, filters)
 
-    return jsonify(apartamentos_json)
+    return jsonify(
+        total=sum(faixa['quantidade'] for faixa in preco['faixas']),
+        comodos=facet_counts(query, AnuncioApartamento.comodos),
+        status=facet_counts(query, AnuncioApartamento.status),
+        preco=preco
+    )
 
 
 @bp.route(DELETE_AD, methods=['DELETE'])
@@ -387,13 +607,15 @@ def delete_ad():
 
     if not ad_id: abort(400, 'O campo de ID deve ser preenchido.')
 
-    ad = Anuncio.query.filter_by(id=ad_id).one_or_none()
+    ad = get_anuncio(ad_id)
 
     if not ad: abort(400, 'Anúncio não existe.')
     if not ad.is_from_user(current_user): abort(401, 'Anúncio deletável apenas por autor.')
 
+    release_image(ad.ad_img)
     db.session.delete(ad)
     db.session.commit()
+    invalidate_search_cache()
 
     return jsonify(message='Anúncio deletado.')
 
@@ -408,6 +630,8 @@ def logout():
     now = datetime.now(timezone.utc)
     db.session.add(TokenBlockList(jti, now))
     db.session.commit()
+    jwt_cache()['revoked'].set(jti, True)
+    revoked_tokens().add(jti)
     return jsonify(msg="JWT revogado.")
 
 
@@ -415,24 +639,81 @@ def logout():
 @jwt_required()
 def fav_ad():
     anuncio_id = request.json.get('anuncio_id')
-    anuncio = Anuncio.query.get(anuncio_id)
+    anuncio_exists = db.session.query(Anuncio.id).filter_by(id=anuncio_id).scalar()
     # Obtém o usuário atual a partir da sessão
     user = current_user
 
     # Verifica se o usuário está autenticado
     if not user:
         abort(401, 'Nenhum usuário logado.')
-    if not anuncio:
+    if not anuncio_exists:
         abort(401, 'O anúncio não foi encontrado')
-    if anuncio in user.anuncios_favoritos:
+
+    # a restrição única de (user_id, anuncio_id) detecta o favorito repetido
+    try:
+        inserted = insert_ignoring_conflicts(Favorites, [{'user_id': user.id, 'anuncio_id': anuncio_id}], ['user_id', 'anuncio_id'])
+    except IntegrityError:
+        # o anúncio foi apagado depois da verificação acima
+        db.session.rollback()
+        abort(404, 'O anúncio não foi encontrado')
+
+    if not inserted:
         abort(400, 'O anúncio já está nos favoritos do usuário.')
 
-    user.anuncios_favoritos.append(anuncio)
     db.session.commit()
 
     return jsonify(message='Anúncio favoritado com sucesso.'), 200
 
 
+@bp.route(FAV_ADS, methods=['POST', 'DELETE'])
+@jwt_required()
+def fav_ads_bulk():
+    """
+    Adiciona (POST) ou remove (DELETE) vários anúncios dos favoritos do usuário de uma vez.
+
+    O corpo da requisição deve conter `anuncio_ids`, a lista de IDs dos anúncios.
+
+    Returns:
+        Um objeto JSON com a quantidade de favoritos alterados e os IDs de anúncios não encontrados.
+
+    Raises:
+        BadRequest: Se a lista de IDs não for fornecida ou passar de FAV_BULK_MAX itens.
+    """
+    user = current_user
+    anuncio_ids = request.json.get('anuncio_ids', None)
+
+    if not user:
+        abort(401, 'Nenhum usuário logado.')
+    if not isinstance(anuncio_ids, list) or not all(type(anuncio_id) is int for anuncio_id in anuncio_ids):
+        abort(400, 'O campo anuncio_ids deve ser uma lista de IDs.')
+    if len(anuncio_ids) > FAV_BULK_MAX:
+        abort(400, f'No máximo {FAV_BULK_MAX} anúncios por requisição.')
+
+    anuncio_ids = set(anuncio_ids)
+
+    if request.method == 'DELETE':
+        removed = (Favorites.query
+                   .filter(Favorites.user_id == user.id, Favorites.anuncio_id.in_(anuncio_ids))
+                   .delete(synchronize_session=False))
+        db.session.commit()
+
+        return jsonify(message='Favoritos removidos.', removidos=removed), 200
+
+    existing_ids = {anuncio_id for anuncio_id, in db.session.query(Anuncio.id).filter(Anuncio.id.in_(anuncio_ids))}
+
+    rows = [{'user_id': user.id, 'anuncio_id': anuncio_id} for anuncio_id in sorted(existing_ids)]
+
+    try:
+        added = insert_ignoring_conflicts(Favorites, rows, ['user_id', 'anuncio_id'])
+    except IntegrityError:
+        # algum dos anúncios foi apagado depois da consulta acima
+        db.session.rollback()
+        abort(404, 'Algum dos anúncios não foi encontrado.')
+    db.session.commit()
+
+    return jsonify(message='Favoritos adicionados.', adicionados=added, nao_encontrados=sorted(anuncio_ids - existing_ids)), 200
+
+
 @bp.route(GET_FAV_ADS, methods=['GET'])
 @jwt_required()
 def get_favorited_anuncios():
@@ -440,9 +721,18 @@ def get_favorited_anuncios():
     if not user:
         abort(401, 'Nenhum usuário logado.')
 
-    anuncios_favoritados = user.anuncios_favoritos
+    # livros e apartamentos misturados, carregados com as colunas dos subtipos
+    query, entity = anuncio_query()
+    options, serialize = field_projection(Anuncio, parse_fields(request.args.get('fields', None), Anuncio), entity)
+
+    anuncios_favoritados = (query
+                            .join(Favorites, Favorites.anuncio_id == entity.id)
+                            .filter(Favorites.user_id == user.id)
+                            .order_by(Favorites.id)
+                            .options(*options)
+                            .all())
 
-    favoritos = [anuncio.get_to_dict() for anuncio in anuncios_favoritados]
+    favoritos = [serialize(anuncio) for anuncio in anuncios_favoritados]
 
     return jsonify(favoritos)
 
@@ -452,19 +742,21 @@ def get_favorited_anuncios():
 def upload_image_ad():
     ad_id = request.form.get('ad_id')
     img = request.files['ad_img']
-    img_filename = secure_filename(img.filename)
-    real_filename = str(uuid.uuid1()) + '_' + img_filename
 
-    image_path = Path(IMAGE_PATH + real_filename).expanduser()
+    ad = get_anuncio(ad_id)
 
-    img.save(image_path)
+    if not ad: abort(404, 'Anúncio não encontrado')
+    if not ad.is_from_user(current_user): abort(401, 'Usuário não autorizado para editar este anúncio')
 
-    ad = Anuncio.query.get(ad_id)
-    ad.ad_img = real_filename
+    image_name = store_image(img)
+
+    old_image, ad.ad_img = ad.ad_img, image_name
+    release_image(old_image)
 
     db.session.commit()
+    invalidate_search_cache()
 
-    image_location = url_for('bp.get_image', file_name=real_filename, _external=True)
+    image_location = url_for('bp.get_image', file_name=image_name, _external=True)
 
     return jsonify(message='Image uploaded.'), 200, {'Location': image_location}
 
@@ -473,23 +765,48 @@ def upload_image_ad():
 @jwt_required()
 def upload_profile_picture():
     img = request.files['profile_img']
-    img_filename = secure_filename(img.filename)
-    real_filename = str(uuid.uuid1()) + '_' + img_filename
 
-    image_path = Path(IMAGE_PATH + real_filename).expanduser()
+    user = User.query.get(current_user.id)
 
-    img.save(image_path)
+    image_name = store_image(img)
 
-    user = User.query.get(current_user.id)
-    user.profile_img = real_filename
+    old_image, user.profile_img = user.profile_img, image_name
+    release_image(old_image)
 
     db.session.commit()
+    invalidate_cached_user(user.username)
 
-    image_location = url_for('bp.get_image', file_name=real_filename, _external=True)
+    image_location = url_for('bp.get_image', file_name=image_name, _external=True)
 
     return jsonify(message='Image uploaded.'), 200, {'Location': image_location}
 
 
 @bp.route(IMAGE, methods=['GET'])
+@compression_level(0)
 def get_image(file_name):
-    return send_file(Path(IMAGE_PATH + file_name).expanduser(), mimetype='image/png')
+    path = image_file(file_name)
+
+    if not path.is_file(): abort(404, 'Imagem não encontrada.')
+
+    return image_response(path, file_name)
+
+
+@bp.route(POOL_STATS, methods=['GET'])
+def get_pool_stats():
+    """
+    Estatísticas do pool de conexões do worker que atendeu o request: conexões em uso,
+    livres e de overflow, e o histograma da espera por conexão.
+    """
+    if not current_app.config.get('POOL_STATS_ENABLED', POOL_STATS_ENABLED): abort(404)
+
+    return jsonify(pool_stats())
+
+
+@bp.route(METRICS, methods=['GET'])
+def get_metrics():
+    """
+    Métricas do worker que atendeu o request no formato texto do Prometheus.
+    """
+    if not current_app.config.get('METRICS_ENABLED', METRICS_ENABLED): abort(404)
+
+    return current_app.response_class(exposition(), mimetype='text/plain; version=0.0.4')
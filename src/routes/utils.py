@@ -1,4 +1,29 @@
-from models.model import db
+import base64
+import functools
+import json
+
+from flask import Request, Response, abort, current_app, g, jsonify, request, stream_with_context
+from werkzeug.exceptions import BadRequest
+from werkzeug.utils import send_file
+from sqlalchemy import and_, or_, case, func, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import defer, joinedload, lazyload, load_only, selectinload, subqueryload, selectin_polymorphic, with_polymorphic
+
+from models.model import db, User, Anuncio, AnuncioLivro, AnuncioApartamento
+from models.images import sniff_mimetype, is_content_addressed, image_upload_stream, SNIFF_SIZE
+from conf.config import (
+    IMAGE,
+    IMAGE_MAX_AGE,
+    IMAGE_IMMUTABLE_MAX_AGE,
+    IMAGE_ACCEL_PREFIX,
+    SEARCH_PAGE_SIZE,
+    SEARCH_MAX_PAGE_SIZE,
+    SEARCH_STREAM_BATCH,
+    NEXT_CURSOR_HEADER,
+    SEARCH_CACHE_HEADER,
+    FACET_PRICE_BUCKETS,
+    FACET_MAX_PRICE_BUCKETS
+)
 
 
 def increase_rating(current_user):
@@ -11,3 +36,560 @@ def increase_rating(current_user):
     rating += 1
 
     db.commit()
+
+
+def parse_ad(payload):
+    """
+    Valida os dados de criação de um anúncio.
+
+    Returns:
+        A classe do anúncio (AnuncioLivro ou AnuncioApartamento) e os campos do anúncio,
+        exceto anunciante e status.
+
+    Raises:
+        ValueError: Com a mensagem de erro, se os dados forem inválidos.
+    """
+    if not isinstance(payload, dict): raise ValueError('Anúncio inválido.')
+
+    categoria = payload.get("categoria", None)
+
+    if not categoria: raise ValueError('Categoria é necessária.')
+    if categoria not in ('livro', 'apartamento'): raise ValueError('Não existem anuncios dessa categoria')
+
+    try:
+        fields = {
+            'titulo': payload.get("titulo", None),
+            'descricao': payload.get("descricao", None),
+            'preco': float(payload.get("preco", None))
+        }
+
+        if categoria == 'livro':
+            model = AnuncioLivro
+            fields['titulo_livro'] = payload.get('tituloLivro', None)
+            fields['autor'] = payload.get('autor', None)
+            fields['genero'] = payload.get('genero', None)
+            required = dict(fields)
+            fields['aceita_trocas'] = bool(payload.get('aceitaTroca', False))
+        else:
+            model = AnuncioApartamento
+            fields['endereco'] = payload.get('endereco', None)
+            fields['area'] = int(payload.get('area', None))
+            fields['comodos'] = int(payload.get('comodos', None))
+            required = fields
+    except (TypeError, ValueError):
+        raise ValueError('Todos os campos precisam ser preenchidos.')
+
+    if not all(required.values()): raise ValueError('Todos os campos precisam ser preenchidos.')
+
+    return model, fields
+
+
+def conflicting_field(error, fields):
+    """
+    Descobre qual campo violou uma restrição única a partir do IntegrityError do banco.
+
+    Usa o nome da restrição informado pelo PostgreSQL (ex.: `user_email_key`) ou, nos
+    demais bancos, a mensagem de erro (ex.: `UNIQUE constraint failed: user.email`).
+
+    Returns:
+        O primeiro campo de `fields` citado no erro, ou None.
+    """
+    diag = getattr(error.orig, 'diag', None)
+    text = getattr(diag, 'constraint_name', None) or str(error.orig)
+
+    for field in fields:
+        if field in text: return field
+
+    return None
+
+
+def insert_ignoring_conflicts(model, rows, index_elements):
+    """
+    Insere as linhas com um único INSERT ... ON CONFLICT (index_elements) DO NOTHING,
+    ignorando as que violam a restrição única dessas colunas. Sem a restrição, o banco
+    recusa o INSERT em vez de aceitar linhas duplicadas.
+
+    Returns:
+        A quantidade de linhas efetivamente inseridas.
+    """
+    if not rows: return 0
+
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(model).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+
+    return db.session.execute(statement).rowcount
+
+
+_ANUNCIANTE_LOADERS = {
+    'joined': joinedload,
+    'selectin': selectinload,
+    'subquery': subqueryload,
+    'lazy': lazyload
+}
+
+
+def anunciante_loader(entity=Anuncio, stream=False):
+    """
+    Opção de consulta que carrega os anunciantes em lote, conforme a estratégia
+    configurada em ANUNCIANTE_LOADING, evitando um SELECT por anúncio serializado.
+    `entity` é a entidade consultada (um subtipo ou a de `anuncio_query`).
+
+    Em consultas em `stream` (lidas com yield_per), `subquery` é trocado por
+    `selectin`: o SQLAlchemy não combina subqueryload com yield_per.
+    """
+    strategy = current_app.config['ANUNCIANTE_LOADING']
+
+    if strategy not in _ANUNCIANTE_LOADERS:
+        raise ValueError(f'Estratégia de carregamento desconhecida: {strategy}')
+
+    if stream and strategy == 'subquery': strategy = 'selectin'
+
+    return _ANUNCIANTE_LOADERS[strategy](entity.anunciante)
+
+
+ANUNCIO_SUBTYPES = (AnuncioLivro, AnuncioApartamento)
+
+
+def anuncio_query():
+    """
+    Consulta pela classe base Anuncio que carrega as colunas dos subtipos conforme
+    ANUNCIO_POLYMORPHIC_LOADING: `joined` lê tudo no mesmo SELECT (LEFT OUTER JOIN com
+    as tabelas dos subtipos), `selectin` faz um SELECT a mais por subtipo presente e
+    `lazy` deixa cada anúncio buscar as colunas do subtipo no primeiro acesso.
+
+    Returns:
+        A consulta e a entidade a usar nos filtros e nas opções de carregamento.
+    """
+    strategy = current_app.config['ANUNCIO_POLYMORPHIC_LOADING']
+
+    if strategy == 'joined':
+        entity = with_polymorphic(Anuncio, ANUNCIO_SUBTYPES)
+        return db.session.query(entity), entity
+    if strategy == 'selectin':
+        return Anuncio.query.options(selectin_polymorphic(Anuncio, ANUNCIO_SUBTYPES)), Anuncio
+    if strategy == 'lazy':
+        return Anuncio.query, Anuncio
+
+    raise ValueError(f'Estratégia de carregamento desconhecida: {strategy}')
+
+
+def get_anuncio(anuncio_id):
+    """
+    Busca um anúncio de qualquer tipo pelo ID, já com as colunas do subtipo.
+    """
+    query, entity = anuncio_query()
+    return query.filter(entity.id == anuncio_id).one_or_none()
+
+
+# campos de `get_to_dict` de cada tipo de anúncio; a listagem de favoritos mistura os dois
+LISTING_FIELDS = {
+    AnuncioLivro: ('titulo', 'anunciante', 'descricao', 'preco', 'titulo_livro', 'autor', 'genero', 'status', 'aceita_trocas', 'image_location'),
+    AnuncioApartamento: ('titulo', 'anunciante', 'descricao', 'preco', 'endereco', 'area', 'comodos', 'status', 'image_location')
+}
+LISTING_FIELDS[Anuncio] = tuple(dict.fromkeys(LISTING_FIELDS[AnuncioLivro] + LISTING_FIELDS[AnuncioApartamento]))
+
+# campos calculados: a coluna lida do banco e como obter o valor
+_COMPUTED_FIELDS = {
+    'anunciante': ('user_id', lambda anuncio: anuncio.anunciante.username),
+    'image_location': ('ad_img', lambda anuncio: f'{IMAGE.removesuffix("<file_name>")}{anuncio.ad_img}')
+}
+
+
+def parse_fields(fields, model):
+    """
+    Lê a projeção pedida pelo cliente, em lista ou separada por vírgulas.
+
+    Returns:
+        Os campos pedidos, na ordem e sem repetição, ou None para todos os campos.
+
+    Raises:
+        BadRequest: Se algum campo não existir em `get_to_dict` do modelo.
+    """
+    if not fields: return None
+
+    if isinstance(fields, str): fields = fields.split(',')
+
+    if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        abort(400, 'Campos inválidos.')
+
+    fields = tuple(dict.fromkeys(field.strip() for field in fields if field.strip()))
+    unknown = [field for field in fields if field not in LISTING_FIELDS[model]]
+
+    if unknown: abort(400, f'Campos inválidos: {", ".join(unknown)}.')
+
+    return fields or None
+
+
+def field_projection(model, fields, entity=None, stream=False):
+    """
+    Monta as opções de carregamento e a serialização de uma listagem limitada aos
+    campos pedidos: o SELECT lê apenas as colunas necessárias (além da chave) e os
+    anunciantes só são carregados quando o campo `anunciante` é pedido.
+
+    `entity` é a entidade consultada, quando diferente de `model` (a carga polimórfica
+    de `anuncio_query`, que também lê as colunas pedidas dos subtipos). `stream` indica
+    que a consulta será lida em lotes (ver `anunciante_loader`).
+
+    Returns:
+        A lista de opções da consulta e a função que serializa cada anúncio.
+    """
+    entity = entity if entity is not None else model
+
+    if fields is None: return [anunciante_loader(entity, stream)], lambda anuncio: anuncio.get_to_dict()
+
+    columns = [_COMPUTED_FIELDS[field][0] if field in _COMPUTED_FIELDS else field for field in fields]
+    attributes = []
+
+    for column in columns:
+        if hasattr(model, column):
+            attributes.append(getattr(entity, column))
+        elif entity is not model:
+            attributes += [getattr(getattr(entity, subtype.__name__), column) for subtype in ANUNCIO_SUBTYPES if hasattr(subtype, column)]
+
+    options = [load_only(entity.id, *attributes)]
+
+    if entity is Anuncio and model is Anuncio:
+        # sem with_polymorphic, as colunas dos subtipos vêm dos SELECTs de selectin_polymorphic
+        # (ou do primeiro acesso): os que não foram pedidos ficam de fora
+        options += [
+            defer(getattr(subtype, column.key))
+            for subtype in ANUNCIO_SUBTYPES
+            for column in subtype.__table__.columns
+            if not column.primary_key and column.key not in columns
+        ]
+
+    if 'anunciante' in fields: options.append(anunciante_loader(entity, stream).load_only(User.username))
+
+    getters = [(field, column, _COMPUTED_FIELDS[field][1] if field in _COMPUTED_FIELDS else None) for field, column in zip(fields, columns)]
+
+    def serialize(anuncio):
+        # campos de outro tipo de anúncio (na listagem de favoritos) são omitidos
+        return {
+            field: getter(anuncio) if getter else getattr(anuncio, column)
+            for field, column, getter in getters
+            if hasattr(anuncio, column)
+        }
+
+    return options, serialize
+
+
+class UploadRequest(Request):
+    """
+    Request que escreve os arquivos enviados em multipart/form-data direto em um
+    ImageUpload, validando e calculando o hash durante o recebimento do corpo.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return image_upload_stream()
+
+
+def encode_cursor(last_id, rank=None):
+    """
+    Gera o cursor opaco que aponta para o último anúncio de uma página.
+    """
+    key = {'id': last_id}
+    if rank is not None: key['rank'] = rank
+
+    raw = json.dumps(key).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Recupera o ID (e a relevância, em buscas por termo) do último anúncio visto a partir do cursor opaco.
+
+    Raises:
+        BadRequest: Se o cursor não tiver sido gerado pelo servidor.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        last_id, rank = key['id'], key.get('rank', None)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        abort(400, 'Cursor inválido.')
+
+    if not isinstance(last_id, int): abort(400, 'Cursor inválido.')
+    if rank is not None and not isinstance(rank, (int, float)): abort(400, 'Cursor inválido.')
+
+    return last_id, rank
+
+
+def parse_limit(filters, default):
+    """
+    Lê o tamanho de página pedido pelo cliente, limitado a SEARCH_MAX_PAGE_SIZE.
+    """
+    limit = filters.get('limit', None)
+
+    if limit is None: return default
+
+    try:
+        limit = int(limit)
+    except (ValueError, TypeError):
+        abort(400, 'Limite inválido.')
+
+    if limit < 1: abort(400, 'Limite inválido.')
+
+    return min(limit, SEARCH_MAX_PAGE_SIZE)
+
+
+def parse_stream(filters):
+    """
+    Lê o campo `stream` dos filtros, que deve ser um booleano JSON.
+    """
+    stream = (filters or {}).get('stream', False)
+
+    if not isinstance(stream, bool): abort(400, 'O campo stream deve ser um booleano.')
+
+    return stream
+
+
+def listing_response(query, key_column, filters, serialize, rank=None):
+    """
+    Responde uma listagem paginada por keyset a partir de uma consulta já filtrada.
+
+    A consulta é ordenada por `key_column` (ou por relevância decrescente e depois
+    `key_column`, quando `rank` é informado) e continua a partir do cursor `after`.
+    Por padrão devolve uma página de até `limit` itens e o cursor da próxima página
+    no header NEXT_CURSOR_HEADER. Com `stream` verdadeiro, os itens são escritos na
+    resposta à medida que saem do cursor do banco, sem materializar a lista.
+    """
+    filters = filters or {}
+    stream = parse_stream(filters)
+    after = filters.get('after', None)
+
+    if rank is not None:
+        query = query.add_columns(rank).order_by(rank.desc(), key_column)
+    else:
+        query = query.order_by(key_column)
+
+    if after is not None:
+        last_id, last_rank = decode_cursor(after)
+
+        if rank is not None and last_rank is not None:
+            query = query.filter(or_(rank < last_rank, and_(rank == last_rank, key_column > last_id)))
+        else:
+            query = query.filter(key_column > last_id)
+
+    if stream:
+        limit = parse_limit(filters, None)
+
+        if limit: query = query.limit(limit)
+
+        return Response(stream_with_context(_stream_json(query, serialize, rank is not None)), mimetype='application/json')
+
+    limit = parse_limit(filters, SEARCH_PAGE_SIZE)
+
+    # busca um item a mais para saber se existe uma próxima página
+    resultados = query.limit(limit + 1).all()
+    pagina = resultados[:limit]
+
+    response = jsonify([serialize(_item(row, rank is not None)) for row in pagina])
+
+    if len(resultados) > limit:
+        last = pagina[-1]
+
+        if rank is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last[0].id, last[1])
+        else:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.id)
+
+    return response
+
+
+def _item(row, ranked):
+    return row[0] if ranked else row
+
+
+def _stream_json(query, serialize, ranked):
+    yield '['
+
+    first = True
+    for row in query.yield_per(SEARCH_STREAM_BATCH):
+        if not first: yield ','
+        first = False
+        yield current_app.json.dumps(serialize(_item(row, ranked)))
+
+    yield ']'
+
+
+def facet_counts(query, column):
+    """
+    Conta os anúncios da consulta filtrada para cada valor de `column`, com um GROUP BY.
+
+    Returns:
+        Uma lista de objetos com o valor e a quantidade, ordenada pelo valor.
+    """
+    rows = query.with_entities(column, func.count()).group_by(column).order_by(column)
+
+    return [{'valor': value, 'quantidade': count} for value, count in rows]
+
+
+def price_histogram(query, column, filters):
+    """
+    Monta o histograma de preços dos anúncios da consulta filtrada, em faixas de
+    mesma largura entre o menor e o maior preço.
+
+    É uma única consulta agregada: os limites saem de uma CTE sobre os preços filtrados
+    e todas as faixas são contadas de uma vez, sem trazer os anúncios do banco. A
+    quantidade de faixas vem de `faixas_preco` (padrão FACET_PRICE_BUCKETS, máximo
+    FACET_MAX_PRICE_BUCKETS).
+    """
+    buckets = (filters or {}).get('faixas_preco', None)
+
+    if buckets is None: buckets = FACET_PRICE_BUCKETS
+    if isinstance(buckets, bool) or not isinstance(buckets, int) or buckets < 1: abort(400, 'Quantidade de faixas inválida.')
+
+    buckets = min(buckets, FACET_MAX_PRICE_BUCKETS)
+
+    precos = query.with_entities(column.label('preco')).cte('precos')
+    limites = db.session.query(func.min(precos.c.preco).label('low'), func.max(precos.c.preco).label('high')).cte('limites')
+
+    preco, menor, maior = precos.c.preco, limites.c.low, limites.c.high
+    largura = (maior - menor) / buckets
+
+    # a última faixa é fechada para incluir o maior preço
+    low, high, *counts = (db.session.query(menor, maior, *[
+                              func.count(case((and_(preco >= menor + i * largura, preco <= maior if i == buckets - 1 else preco < menor + (i + 1) * largura), 1)))
+                              for i in range(buckets)
+                          ])
+                          .select_from(limites)
+                          .outerjoin(precos, true())
+                          .group_by(menor, maior)
+                          .one())
+
+    if low is None: return {'min': None, 'max': None, 'faixas': []}
+
+    # todos os preços iguais: uma única faixa
+    if low == high: buckets, counts = 1, [sum(counts)]
+
+    width = (high - low) / buckets
+    bounds = [(low + i * width, high if i == buckets - 1 else low + (i + 1) * width) for i in range(buckets)]
+
+    return {
+        'min': low,
+        'max': high,
+        'faixas': [{'de': start, 'ate': end, 'quantidade': count} for (start, end), count in zip(bounds, counts)]
+    }
+
+
+def search_cache():
+    return current_app.extensions.get('facilitai_search_cache')
+
+
+def invalidate_search_cache():
+    """
+    Descarta as respostas de busca em cache. Deve ser chamada depois de qualquer
+    escrita que mude o resultado das buscas (anúncios ou nomes de anunciantes).
+    """
+    cache = search_cache()
+    if cache is not None: cache.clear()
+
+
+def search_cache_key(filters):
+    """
+    Chave do cache de uma busca: o endpoint e os filtros normalizados (ordenados,
+    sem os vazios), de modo que filtros equivalentes compartilhem a mesma entrada.
+    """
+    filters = {key: value for key, value in (filters or {}).items() if value not in (None, '', [], {})}
+    return request.endpoint + ':' + json.dumps(filters, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def cached_search(view):
+    """
+    Guarda as respostas de uma rota de busca no cache configurado em
+    SEARCH_CACHE_BACKEND, chaveadas pelos filtros do corpo da requisição.
+
+    Apenas páginas com status 200 são guardadas; respostas em streaming nunca passam
+    pelo cache. O header SEARCH_CACHE_HEADER indica se a resposta veio do cache.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = search_cache()
+
+        # corpos que não são JSON válido seguem para a rota e recebem o mesmo 400 com ou
+        # sem cache, em vez da página sem filtros guardada
+        if cache is None or not request.is_json: return view(*args, **kwargs)
+
+        try:
+            filters = request.get_json()
+        except BadRequest:
+            return view(*args, **kwargs)
+
+        if not isinstance(filters, (dict, type(None))) or (filters and filters.get('stream')):
+            return view(*args, **kwargs)
+
+        key = search_cache_key(filters)
+        cached = cache.get(key)
+
+        # permite guardar no cache também a versão comprimida da resposta
+        g.search_cache_key = key
+
+        if cached is not None:
+            body, headers = cached
+            response = current_app.response_class(body, mimetype='application/json')
+            response.headers.update(headers)
+            response.headers[SEARCH_CACHE_HEADER] = 'HIT'
+            return response
+
+        response = current_app.make_response(view(*args, **kwargs))
+
+        if response.status_code == 200 and not response.is_streamed:
+            headers = {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]} if NEXT_CURSOR_HEADER in response.headers else {}
+            cache.set(key, (response.get_data(), headers))
+
+        response.headers[SEARCH_CACHE_HEADER] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def image_response(path, name):
+    """
+    Responde o arquivo de imagem com validadores de cache (ETag e Last-Modified),
+    tratando `304 Not Modified` e requisições parciais (Range).
+
+    Imagens endereçadas por conteúdo nunca mudam: usam o próprio hash como ETag forte
+    e são marcadas como imutáveis. Com IMAGE_OFFLOAD em `x-sendfile` ou
+    `x-accel-redirect`, os bytes são servidos pelo servidor web e não pelo worker.
+    """
+    config = current_app.config
+    immutable = is_content_addressed(name)
+    max_age = config.get('IMAGE_IMMUTABLE_MAX_AGE', IMAGE_IMMUTABLE_MAX_AGE) if immutable else config.get('IMAGE_MAX_AGE', IMAGE_MAX_AGE)
+    offload = config.get('IMAGE_OFFLOAD', None)
+
+    with open(path, 'rb') as image:
+        mimetype = sniff_mimetype(image.read(SNIFF_SIZE)) or 'application/octet-stream'
+
+    if offload:
+        # o servidor web envia o arquivo e trata os Ranges; aqui só os validadores de cache
+        stat = path.stat()
+
+        response = current_app.response_class(mimetype=mimetype)
+        response.set_etag(name if immutable else f'{int(stat.st_mtime)}-{stat.st_size}')
+        response.last_modified = stat.st_mtime
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response = response.make_conditional(request.environ)
+
+        if response.status_code == 200:
+            if offload == 'x-accel-redirect':
+                prefix = config.get('IMAGE_ACCEL_PREFIX', IMAGE_ACCEL_PREFIX)
+                response.headers['X-Accel-Redirect'] = prefix + name
+            else:
+                response.headers['X-Sendfile'] = str(path.resolve())
+    else:
+        response = send_file(
+            path,
+            request.environ,
+            mimetype=mimetype,
+            etag=name if immutable else True,
+            max_age=max_age,
+            response_class=current_app.response_class
+        )
+
+    if immutable: response.cache_control.immutable = True
+
+    # bytes entregues ao cliente, para as métricas (no offload, pelo servidor web)
+    g.image_bytes = stat.st_size if offload and response.status_code == 200 else response.content_length or 0
+
+    return response
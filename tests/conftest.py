@@ -11,8 +11,22 @@ from helpers import Helpers
 
 
 @pytest.fixture
-def app(postgres):
-    app = create_app({"SQLALCHEMY_DATABASE_URI": postgres.get_connection_url()})
+def app_config(postgres):
+    # sem as threads de envio de emails e de limpeza da blocklist, que seguiriam
+    # consultando o banco depois do drop_all de cada teste, e com o hash de senhas na
+    # própria thread, sem subir processos para cada app; use também nos apps criados
+    # pelos próprios testes
+    return {
+        "SQLALCHEMY_DATABASE_URI": postgres.get_connection_url(),
+        "MAIL_WORKER_INTERVAL": 0,
+        "BLOCKLIST_PURGE_INTERVAL": 0,
+        "PASSWORD_HASH_WORKERS": 0
+    }
+
+
+@pytest.fixture
+def app(app_config):
+    app = create_app(app_config)
     yield app
 
 
@@ -1,3 +1,6 @@
+import socketserver
+import threading
+
 from werkzeug.security import generate_password_hash
 
 from models.model import User, AnuncioLivro, AnuncioApartamento, StatusAnuncio
@@ -67,4 +70,54 @@ class Helpers:
 
         access_token = login_json['access_token']
 
-        return access_token
\ No newline at end of file
+        return access_token
+
+class LocalSMTPServer:
+    """
+    Servidor SMTP mínimo para testes: aceita qualquer remetente e destinatário
+    e guarda as mensagens recebidas e a quantidade de conexões abertas.
+    """
+
+    def __init__(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f'{line}\r\n'.encode())
+
+            def handle(self):
+                server.connections += 1
+                self.reply('220 localhost')
+
+                for raw in self.rfile:
+                    command = raw.decode().strip().upper()
+
+                    if command.startswith(('EHLO', 'HELO')):
+                        self.reply('250 localhost')
+                    elif command == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        lines = []
+                        for line in self.rfile:
+                            if line in (b'.\r\n', b'.\n'): break
+                            lines.append(line)
+                        server.messages.append(b''.join(lines).decode())
+                        self.reply('250 OK')
+                    elif command == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('250 OK')
+
+        self.messages = []
+        self.connections = 0
+        self._server = socketserver.ThreadingTCPServer(('localhost', 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
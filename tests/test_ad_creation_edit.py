@@ -3,6 +3,7 @@ import uuid
 from models.model import AnuncioLivro, AnuncioApartamento, StatusAnuncio, Anuncio
 from conf.config import (
     CREATE_AD,
+    CREATE_ADS,
     EDIT_AD,
     SEARCH_APARTMENTS,
     SEARCH_BOOKS
@@ -181,4 +182,66 @@ def test_edit_ad_book(client, db_session, helpers, faker, json_headers):
     edited_ads = client.get(SEARCH_BOOKS, json={})
 
     assert response.status_code == 200
-    assert edit['descricao'] in edited_ads.text
\ No newline at end of file
+    assert edit['descricao'] in edited_ads.text
+
+def test_create_ads_batch(client, db_session, helpers, faker, json_headers):
+
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+
+    json_headers['Authorization'] = f'Bearer {access_token}'
+
+    livro = {
+        "titulo": "Livro de estatística aplicada",
+        "descricao": "Livro em perfeito estado, nunca usado",
+        "preco": "300",
+        "categoria": "livro",
+        "tituloLivro": "Estatística Básica",
+        "autor": "Bussab e Morettin",
+        "genero": "Educação"
+    }
+
+    apartamento = {
+        "titulo": "Apartamento perto da ufcg",
+        "descricao": "apartamento a 200m da ufcg",
+        "preco": 1000,
+        "categoria": "apartamento",
+        "endereco": "Rua de Teste, 325, Universitário",
+        "area": 120,
+        "comodos": 3
+    }
+
+    response = client.post(CREATE_ADS, headers=json_headers, json={'anuncios': [livro, apartamento, livro]})
+
+    assert response.status_code == 201
+    assert len(response.json['ad_ids']) == 3
+
+    assert db_session.query(AnuncioLivro).count() == 2
+    ap = db_session.query(AnuncioApartamento).one()
+    assert ap.id == response.json['ad_ids'][1]
+    assert ap.endereco == apartamento['endereco']
+
+
+def test_create_ads_batch_reports_errors(client, db_session, helpers, faker, json_headers):
+
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+
+    json_headers['Authorization'] = f'Bearer {access_token}'
+
+    apartamento = {
+        "titulo": "Apartamento perto da ufcg",
+        "descricao": "apartamento a 200m da ufcg",
+        "preco": 1000,
+        "categoria": "apartamento",
+        "endereco": "Rua de Teste, 325, Universitário",
+        "area": 120,
+        "comodos": 3
+    }
+
+    body = {'anuncios': [apartamento, {"categoria": "Piscina"}, apartamento]}
+    response = client.post(CREATE_ADS, headers=json_headers, json=body)
+
+    assert response.status_code == 400
+    assert [erro['indice'] for erro in response.json['erros']] == [1, 2]
+    assert db_session.query(Anuncio).count() == 0
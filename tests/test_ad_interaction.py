@@ -1,8 +1,21 @@
-from models.model import StatusAnuncio
+import gzip
+import json
+import pytest
+
+from sqlalchemy import event
+
+from models.model import db, StatusAnuncio, Anuncio, AnuncioApartamento
 from conf.config import (
     SEARCH_BOOKS,
     SEARCH_APARTMENTS,
-    FAV_AD
+    SEARCH_BOOKS_FACETS,
+    FAV_AD,
+    FAV_ADS,
+    GET_FAV_ADS,
+    CREATE_AD,
+    NEXT_CURSOR_HEADER,
+    QUERY_COUNT_HEADER,
+    SEARCH_CACHE_HEADER
 )
 
 
@@ -63,6 +76,41 @@ def test_fav_ad_already_favorited(client, helpers, db_session, faker, json_heade
     assert error_msg in response.text
 
 
+def test_fav_ad_deleted_before_insert(app, client, helpers, db_session, faker, json_headers):
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+    json_headers['Authorization'] = f'Bearer {access_token}'
+
+    apartamento1 = {
+        'titulo': 'Apartamento 1',
+        'anunciante': user,
+        'descricao': 'Descrição 1',
+        'preco': 1000.0,
+        'status': StatusAnuncio.AGUARDANDO_ACAO,
+        'endereco': 'Endereço 1',
+        'area': 50,
+        'comodos': 2
+    }
+    ad = helpers.create_ap_ad(db_session, apartamento1)
+
+    # apaga o anúncio entre a verificação de existência e o INSERT do favorito
+    def delete_ad(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO favorites'):
+            cursor.execute(f'DELETE FROM {AnuncioApartamento.__table__.name} WHERE id = {ad.id}')
+            cursor.execute(f'DELETE FROM {Anuncio.__table__.name} WHERE id = {ad.id}')
+
+    with app.app_context():
+        engine = db.engine
+
+    event.listen(engine, 'before_cursor_execute', delete_ad)
+    try:
+        response = client.post(FAV_AD, headers=json_headers, json={'anuncio_id': ad.id})
+    finally:
+        event.remove(engine, 'before_cursor_execute', delete_ad)
+
+    assert response.status_code == 404
+
+
 def test_search_books_with_filters(client, db_session, json_headers, faker, helpers):
     # Cria alguns anúncios de livros de teste no banco de dados
     user, password = helpers.create_user(db_session, faker)
@@ -243,4 +291,373 @@ def test_search_apartments_without_filters(client, db_session, json_headers, fak
     apartamento_2 = data[1]
     assert apartamento_2['titulo'] == 'Apartamento 2'
     assert apartamento_2['preco'] == 2000.0
-    assert apartamento_2['comodos'] == 3
\ No newline at end of file
+    assert apartamento_2['comodos'] == 3
+
+def test_search_books_keyset_pagination(client, db_session, json_headers, faker, helpers):
+    user, password = helpers.create_user(db_session, faker)
+
+    for i in range(5):
+        livro = {
+            'titulo': f'Livro {i}',
+            'anunciante': user,
+            'descricao': f'Descrição {i}',
+            'preco': 10.0 + i,
+            'titulo_livro': f'Livro {i}',
+            'autor': 'Autor X',
+            'genero': 'Ficção',
+            'aceita_trocas': False
+        }
+        helpers.create_book_ad(db_session, livro)
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'limit': 3})
+    assert response.status_code == 200
+    assert [livro['titulo'] for livro in response.json] == ['Livro 0', 'Livro 1', 'Livro 2']
+
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'limit': 3, 'after': cursor})
+    assert [livro['titulo'] for livro in response.json] == ['Livro 3', 'Livro 4']
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_search_apartments_stream(client, db_session, json_headers, faker, helpers):
+    user, password = helpers.create_user(db_session, faker)
+
+    for i in range(3):
+        apartamento = {
+            'titulo': f'Apartamento {i}',
+            'anunciante': user,
+            'descricao': f'Descrição {i}',
+            'preco': 1000.0 + i,
+            'endereco': f'Endereço {i}',
+            'area': 50,
+            'comodos': 2
+        }
+        helpers.create_ap_ad(db_session, apartamento)
+
+    response = client.post(SEARCH_APARTMENTS, headers=json_headers, json={'stream': True})
+    assert response.status_code == 200
+    assert [ap['titulo'] for ap in response.json] == ['Apartamento 0', 'Apartamento 1', 'Apartamento 2']
+
+
+def test_search_stream_with_subquery_loading(app, client, db_session, json_headers, faker, helpers):
+    app.config['ANUNCIANTE_LOADING'] = 'subquery'
+    user, password = helpers.create_user(db_session, faker)
+
+    helpers.create_ap_ad(db_session, {
+        'titulo': 'Apartamento',
+        'anunciante': user,
+        'descricao': 'Descrição',
+        'preco': 1000.0,
+        'endereco': 'Endereço',
+        'area': 50,
+        'comodos': 2
+    })
+
+    response = client.post(SEARCH_APARTMENTS, headers=json_headers, json={'stream': True})
+    assert response.status_code == 200
+    assert response.json[0]['anunciante'] == user.username
+
+
+def test_search_invalid_cursor(client, json_headers):
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'after': 'cursor-invalido'})
+
+    error_msg = 'Cursor inválido.'
+    assert response.status_code == 400
+    assert error_msg in response.text
+
+
+def test_search_stream_must_be_boolean(client, json_headers):
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'stream': 'false'})
+
+    assert response.status_code == 400
+    assert 'O campo stream deve ser um booleano.' in response.text
+
+
+def test_search_books_text_search_ranking(client, db_session, json_headers, faker, helpers):
+    user, password = helpers.create_user(db_session, faker)
+
+    livro1 = {
+        'titulo': 'Clássico de ficção',
+        'anunciante': user,
+        'descricao': 'Exemplar usado',
+        'preco': 30.0,
+        'titulo_livro': 'Duna',
+        'autor': 'Frank Herbert',
+        'genero': 'Ficção',
+        'aceita_trocas': False
+    }
+
+    livro2 = {
+        'titulo': 'Livro de receitas',
+        'anunciante': user,
+        'descricao': 'Capa dura',
+        'preco': 20.0,
+        'titulo_livro': 'Cozinha',
+        'autor': 'Autor Y',
+        'genero': 'Culinária',
+        'aceita_trocas': False
+    }
+
+    helpers.create_book_ad(db_session, livro1)
+    helpers.create_book_ad(db_session, livro2)
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'termo': 'Herbert'})
+    assert response.status_code == 200
+
+    data = response.json
+    assert len(data) == 1
+    assert data[0]['titulo_livro'] == 'Duna'
+
+
+def test_search_books_query_count_constant(app, client, db_session, json_headers, faker, helpers):
+    app.config['DEBUG_HEADERS'] = True
+    # os anúncios são inseridos direto no banco, sem passar pela invalidação do cache de buscas
+    app.extensions['facilitai_search_cache'] = None
+    user, password = helpers.create_user(db_session, faker)
+
+    livro = {
+        'titulo': 'Livro',
+        'anunciante': user,
+        'descricao': 'Descrição',
+        'preco': 10.0,
+        'titulo_livro': 'Livro A',
+        'autor': 'Autor X',
+        'genero': 'Ficção',
+        'aceita_trocas': False
+    }
+
+    helpers.create_book_ad(db_session, dict(livro))
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={})
+    query_count = response.headers[QUERY_COUNT_HEADER]
+
+    for _ in range(3):
+        helpers.create_book_ad(db_session, dict(livro))
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={})
+    assert len(response.json) == 4
+    assert response.headers[QUERY_COUNT_HEADER] == query_count
+
+
+@pytest.mark.parametrize('loading', ['joined', 'selectin'])
+def test_favorites_mixed_types_query_count_constant(app, client, db_session, json_headers, faker, helpers, loading):
+    app.config['DEBUG_HEADERS'] = True
+    app.config['ANUNCIO_POLYMORPHIC_LOADING'] = loading
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+    json_headers['Authorization'] = f'Bearer {access_token}'
+
+    def favorite_pair(i):
+        livro = helpers.create_book_ad(db_session, {
+            'titulo': f'Livro {i}', 'anunciante': user, 'descricao': 'Descrição', 'preco': 10.0,
+            'titulo_livro': f'Livro {i}', 'autor': 'Autor', 'genero': 'Ficção', 'aceita_trocas': False
+        })
+        apartamento = helpers.create_ap_ad(db_session, {
+            'titulo': f'Apartamento {i}', 'anunciante': user, 'descricao': 'Descrição', 'preco': 1000.0,
+            'endereco': f'Endereço {i}', 'area': 50, 'comodos': 2
+        })
+        client.post(FAV_ADS, headers=json_headers, json={'anuncio_ids': [livro.id, apartamento.id]})
+
+    favorite_pair(0)
+    response = client.get(GET_FAV_ADS, headers=json_headers)
+    query_count = response.headers[QUERY_COUNT_HEADER]
+    response = client.get(GET_FAV_ADS + '?fields=titulo,autor,comodos', headers=json_headers)
+    sparse_query_count = response.headers[QUERY_COUNT_HEADER]
+
+    for i in range(1, 4): favorite_pair(i)
+
+    response = client.get(GET_FAV_ADS, headers=json_headers)
+    assert len(response.json) == 8
+    assert response.json[0]['titulo_livro'] == 'Livro 0'
+    assert response.json[1]['endereco'] == 'Endereço 0'
+    assert response.headers[QUERY_COUNT_HEADER] == query_count
+
+    # os campos dos subtipos pedidos vêm junto com o lote, sem uma consulta por anúncio
+    response = client.get(GET_FAV_ADS + '?fields=titulo,autor,comodos', headers=json_headers)
+    assert response.json[0] == {'titulo': 'Livro 0', 'autor': 'Autor'}
+    assert response.json[1] == {'titulo': 'Apartamento 0', 'comodos': 2}
+    assert response.headers[QUERY_COUNT_HEADER] == sparse_query_count
+
+
+def test_fav_ads_bulk_add_and_remove(client, helpers, db_session, faker, json_headers):
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+    json_headers['Authorization'] = f'Bearer {access_token}'
+
+    ads = []
+    for i in range(3):
+        apartamento = {
+            'titulo': f'Apartamento {i}',
+            'anunciante': user,
+            'descricao': f'Descrição {i}',
+            'preco': 1000.0,
+            'endereco': f'Endereço {i}',
+            'area': 50,
+            'comodos': 2
+        }
+        ads.append(helpers.create_ap_ad(db_session, apartamento))
+
+    ids = [ad.id for ad in ads]
+    client.post(FAV_AD, headers=json_headers, json={'anuncio_id': ids[0]})
+
+    response = client.post(FAV_ADS, headers=json_headers, json={'anuncio_ids': ids + [9999]})
+    assert response.status_code == 200
+    assert response.json['adicionados'] == 2
+    assert response.json['nao_encontrados'] == [9999]
+
+    response = client.delete(FAV_ADS, headers=json_headers, json={'anuncio_ids': ids[:2]})
+    assert response.status_code == 200
+    assert response.json['removidos'] == 2
+
+    response = client.get(GET_FAV_ADS, headers=json_headers)
+    assert [anuncio['titulo'] for anuncio in response.json] == ['Apartamento 2']
+
+
+def test_fav_ads_bulk_rejects_booleans(client, helpers, db_session, faker, json_headers):
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+    json_headers['Authorization'] = f'Bearer {access_token}'
+
+    # em Python True é o inteiro 1: sem a checagem, favoritaria o anúncio 1
+    response = client.post(FAV_ADS, headers=json_headers, json={'anuncio_ids': [True]})
+    assert response.status_code == 400
+
+    response = client.delete(FAV_ADS, headers=json_headers, json={'anuncio_ids': [False]})
+    assert response.status_code == 400
+
+
+def test_search_cache_skips_invalid_bodies(client, json_headers):
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={})
+    assert response.status_code == 200
+
+    # com a página sem filtros já no cache, corpos inválidos continuam recebendo 400
+    response = client.post(SEARCH_BOOKS, data='{"genero": ', content_type='application/json')
+    assert response.status_code == 400
+    assert SEARCH_CACHE_HEADER not in response.headers
+
+    response = client.post(SEARCH_BOOKS, data='{}', content_type='text/plain')
+    assert response.status_code == 400
+
+
+def test_search_cache_invalidated_on_create(client, helpers, db_session, faker, json_headers):
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+    headers = dict(json_headers, Authorization=f'Bearer {access_token}')
+
+    livro = {
+        'categoria': 'livro',
+        'titulo': 'Livro',
+        'descricao': 'Descrição',
+        'preco': 10.0,
+        'tituloLivro': 'Livro A',
+        'autor': 'Autor X',
+        'genero': 'Ficção'
+    }
+
+    client.post(CREATE_AD, headers=headers, json=livro)
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'genero': 'Ficção'})
+    assert response.headers[SEARCH_CACHE_HEADER] == 'MISS'
+
+    # filtros equivalentes (mesmas chaves em outra ordem, vazios ignorados) usam a mesma entrada
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'nome_autor': '', 'genero': 'Ficção'})
+    assert response.headers[SEARCH_CACHE_HEADER] == 'HIT'
+    assert len(response.json) == 1
+
+    client.post(CREATE_AD, headers=headers, json=livro)
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'genero': 'Ficção'})
+    assert response.headers[SEARCH_CACHE_HEADER] == 'MISS'
+    assert len(response.json) == 2
+
+
+def test_search_books_facets(client, db_session, json_headers, faker, helpers):
+    user, password = helpers.create_user(db_session, faker)
+
+    for i, genero in enumerate(['Ficção', 'Ficção', 'Drama', 'Terror']):
+        helpers.create_book_ad(db_session, {
+            'titulo': f'Livro {i}',
+            'anunciante': user,
+            'descricao': 'Descrição',
+            'preco': 10.0 * (i + 1),
+            'titulo_livro': f'Livro {i}',
+            'autor': 'Autor X',
+            'genero': genero,
+            'aceita_trocas': i % 2 == 0
+        })
+
+    response = client.post(SEARCH_BOOKS_FACETS, headers=json_headers, json={'preco_min': 20, 'faixas_preco': 2})
+
+    assert response.status_code == 200
+    assert response.json['total'] == 3
+    assert response.json['genero'] == [
+        {'valor': 'Drama', 'quantidade': 1},
+        {'valor': 'Ficção', 'quantidade': 1},
+        {'valor': 'Terror', 'quantidade': 1}
+    ]
+    assert response.json['aceita_trocas'] == [{'valor': False, 'quantidade': 2}, {'valor': True, 'quantidade': 1}]
+    assert response.json['status'] == [{'valor': StatusAnuncio.AGUARDANDO_ACAO.name, 'quantidade': 3}]
+    assert response.json['preco']['min'] == 20.0
+    assert response.json['preco']['max'] == 40.0
+    assert [faixa['quantidade'] for faixa in response.json['preco']['faixas']] == [1, 2]
+
+    response = client.post(SEARCH_BOOKS_FACETS, headers=json_headers, json={'faixas_preco': True})
+    assert response.status_code == 400
+
+
+def test_search_and_favorites_sparse_fields(client, helpers, db_session, faker, json_headers):
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+
+    livro = helpers.create_book_ad(db_session, {
+        'titulo': 'Livro',
+        'anunciante': user,
+        'descricao': 'Descrição',
+        'preco': 10.0,
+        'titulo_livro': 'Livro A',
+        'autor': 'Autor X',
+        'genero': 'Ficção',
+        'aceita_trocas': False
+    })
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'fields': ['titulo', 'preco', 'anunciante']})
+    assert response.status_code == 200
+    assert response.json == [{'titulo': 'Livro', 'preco': 10.0, 'anunciante': user.username}]
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={'fields': ['endereco']})
+    assert response.status_code == 400
+
+    headers = dict(json_headers, Authorization=f'Bearer {access_token}')
+    client.post(FAV_AD, headers=headers, json={'anuncio_id': livro.id})
+
+    response = client.get(GET_FAV_ADS + '?fields=titulo,genero,comodos', headers=headers)
+    assert response.json == [{'titulo': 'Livro', 'genero': 'Ficção'}]
+
+
+def test_search_response_compression(client, db_session, json_headers, faker, helpers):
+    user, password = helpers.create_user(db_session, faker)
+
+    for i in range(20):
+        helpers.create_book_ad(db_session, {
+            'titulo': f'Livro {i}',
+            'anunciante': user,
+            'descricao': 'Descrição',
+            'preco': 10.0,
+            'titulo_livro': f'Livro {i}',
+            'autor': 'Autor X',
+            'genero': 'Ficção',
+            'aceita_trocas': False
+        })
+
+    response = client.post(SEARCH_BOOKS, headers=dict(json_headers, **{'Accept-Encoding': 'gzip'}), json={})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(json.loads(gzip.decompress(response.data))) == 20
+
+    # a versão comprimida guardada no cache de buscas é reaproveitada
+    response = client.post(SEARCH_BOOKS, headers=dict(json_headers, **{'Accept-Encoding': 'gzip'}), json={})
+    assert response.headers[SEARCH_CACHE_HEADER] == 'HIT'
+    assert len(json.loads(gzip.decompress(response.data))) == 20
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.json) == 20
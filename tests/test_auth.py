@@ -1,10 +1,20 @@
-from models.model import User, AnuncioLivro, AnuncioApartamento, StatusAnuncio
+import pytest
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import decode_token
+from werkzeug.security import generate_password_hash
+
+from main.main import create_app
+from models.model import User, AnuncioLivro, AnuncioApartamento, StatusAnuncio, TokenBlockList
+from models.blocklist import purge_expired_tokens, revoked_tokens
+from models.passwords import PasswordHasher
 from conf.config import (
     REGISTER,
     LOGIN,
     LOGOUT,
     GET_FAV_ADS,
-    UPDATE
+    UPDATE,
+    PASSWORD_HASH_METHOD
 )
 
 
@@ -217,4 +227,122 @@ def test_user_updating(helpers, client, db_session, faker, json_headers):
 
     login = client.post(LOGIN, headers=json_headers, json=body)
 
-    assert login.status_code == 200
\ No newline at end of file
+    assert login.status_code == 200
+
+def test_user_updating_invalidates_cached_user(helpers, client, db_session, faker, json_headers):
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+    headers = helpers.bearer_header(access_token)
+
+    # popula o cache de usuários do token
+    response = client.get(GET_FAV_ADS, headers=headers)
+    assert response.status_code == 200
+
+    update = {
+        "username": "edited",
+        "campus": None,
+        "password": None,
+        "curso": None,
+    }
+
+    response = client.post(UPDATE, headers=headers, json=update)
+    assert response.status_code == 204
+
+    # o token antigo aponta para o username anterior e não deve mais ser aceito
+    response = client.get(GET_FAV_ADS, headers=headers)
+    assert response.status_code == 401
+
+
+def test_purge_expired_tokens(app, db_session):
+    expired = datetime.utcnow() - app.config['JWT_ACCESS_TOKEN_EXPIRES'] - timedelta(minutes=1)
+    db_session.add(TokenBlockList('expired-jti', expired))
+    db_session.add(TokenBlockList('recent-jti', datetime.utcnow()))
+    db_session.commit()
+
+    with app.app_context():
+        removed = purge_expired_tokens()
+
+        assert removed == 1
+        assert not revoked_tokens().might_be_revoked('expired-jti')
+        assert revoked_tokens().might_be_revoked('recent-jti')
+
+    assert [token.jti for token in db_session.query(TokenBlockList).all()] == ['recent-jti']
+
+
+def test_blocklist_sync_sees_revocations_committed_out_of_order(app, db_session):
+    with app.app_context():
+        tokens = revoked_tokens()
+        tokens.sync_interval = 0
+        tokens.rebuild()
+        assert not tokens.might_be_revoked('late-jti')
+
+        # logout de outro worker, com created_at anterior à última sincronização
+        db_session.add(TokenBlockList('late-jti', datetime.utcnow() - timedelta(seconds=10)))
+        db_session.commit()
+
+        assert tokens.might_be_revoked('late-jti')
+
+
+def test_false_positive_not_cached_as_valid(app, client, helpers, db_session, faker, json_headers):
+    user, password = helpers.create_user(db_session, faker)
+    access_token = helpers.login_user(user, password, client, json_headers)
+    headers = helpers.bearer_header(access_token)
+
+    with app.app_context():
+        jti = decode_token(access_token)['jti']
+        # falso positivo do filtro de Bloom
+        revoked_tokens().rebuild()
+        revoked_tokens().add(jti)
+
+    assert client.get(GET_FAV_ADS, headers=headers).status_code == 200
+
+    # logout em outro worker: a resposta anterior não pode ter ficado em cache
+    db_session.add(TokenBlockList(jti, datetime.utcnow()))
+    db_session.commit()
+
+    assert client.get(GET_FAV_ADS, headers=headers).status_code == 401
+
+
+def test_user_login_rehashes_outdated_password(client, db_session, json_headers):
+    user = User('old.user', 'old.user@gmail.com', '130130130', 'CG', generate_password_hash('12345678', 'pbkdf2:sha256:1000'), 'CC')
+    db_session.add(user)
+    db_session.commit()
+
+    body = {
+        "username": user.username,
+        "password": '12345678'
+    }
+
+    login = client.post(LOGIN, headers=json_headers, json=body)
+    assert login.status_code == 200
+
+    db_session.refresh(user)
+    assert user.pass_hash.startswith(PASSWORD_HASH_METHOD + '$')
+
+    login = client.post(LOGIN, headers=json_headers, json=body)
+    assert login.status_code == 200
+
+
+def test_needs_rehash_fills_in_default_parameters():
+    # o werkzeug grava o número de iterações padrão quando o método não o informa
+    hasher = PasswordHasher('pbkdf2:sha256', 0)
+
+    assert not hasher.needs_rehash(generate_password_hash('12345678', 'pbkdf2:sha256'))
+    assert hasher.needs_rehash(generate_password_hash('12345678', 'pbkdf2:sha256:1000'))
+
+
+def test_token_accepted_by_other_worker(app_config, helpers, db_session, faker, json_headers):
+    config = {**app_config, 'SECRET_KEY': 'segredo-compartilhado'}
+    worker, other_worker = create_app(config), create_app(config)
+
+    user, password = helpers.create_user(db_session, faker)
+    login = worker.test_client().post(LOGIN, headers=json_headers, json={'username': user.username, 'password': password})
+    headers = helpers.bearer_header(login.json['access_token'])
+
+    assert other_worker.config['JWT_SECRET_KEY'] == 'segredo-compartilhado'
+    assert other_worker.test_client().get(GET_FAV_ADS, headers=headers).status_code == 200
+
+
+def test_require_secrets(app_config):
+    with pytest.raises(RuntimeError):
+        create_app(app_config, require_secrets=True)
@@ -0,0 +1,172 @@
+import io
+
+from werkzeug.datastructures import FileStorage
+
+from models.model import db, Imagem
+from models.images import release_image, store_image
+from conf.config import UPLOAD_IMG_AD, UPLOAD_PROFILE_IMG, DELETE_AD
+
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 256
+
+
+def create_ad_with_user(helpers, db_session, user, titulo):
+    livro = {
+        'titulo': titulo,
+        'anunciante': user,
+        'descricao': 'Descrição',
+        'preco': 10.0,
+        'titulo_livro': 'Livro',
+        'autor': 'Autor',
+        'genero': 'Ficção',
+        'aceita_trocas': False
+    }
+    return helpers.create_book_ad(db_session, livro)
+
+
+def test_upload_deduplicates_images(app, client, helpers, db_session, faker, json_headers, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+    user, password = helpers.create_user(db_session, faker)
+    headers = helpers.bearer_header(helpers.login_user(user, password, client, json_headers))
+
+    ad1 = create_ad_with_user(helpers, db_session, user, 'Livro 1')
+    ad2 = create_ad_with_user(helpers, db_session, user, 'Livro 2')
+
+    locations = set()
+    for ad in (ad1, ad2):
+        data = {'ad_id': ad.id, 'ad_img': (io.BytesIO(PNG_BYTES), 'foto.png')}
+        response = client.post(UPLOAD_IMG_AD, headers=headers, data=data)
+        assert response.status_code == 200
+        locations.add(response.headers['Location'])
+
+    data = {'profile_img': (io.BytesIO(PNG_BYTES), 'perfil.png')}
+    response = client.post(UPLOAD_PROFILE_IMG, headers=headers, data=data)
+    assert response.status_code == 200
+    locations.add(response.headers['Location'])
+
+    # os mesmos bytes são gravados uma única vez
+    assert len(locations) == 1
+    assert len(list(tmp_path.iterdir())) == 1
+    assert db_session.query(Imagem).one().referencias == 3
+
+
+def test_unreferenced_image_is_removed(app, client, helpers, db_session, faker, json_headers, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+    user, password = helpers.create_user(db_session, faker)
+    headers = helpers.bearer_header(helpers.login_user(user, password, client, json_headers))
+
+    ad = create_ad_with_user(helpers, db_session, user, 'Livro 1')
+
+    data = {'ad_id': ad.id, 'ad_img': (io.BytesIO(PNG_BYTES), 'foto.png')}
+    response = client.post(UPLOAD_IMG_AD, headers=headers, data=data)
+    assert response.status_code == 200
+
+    response = client.delete(DELETE_AD, headers=headers, json={'id': ad.id})
+    assert response.status_code == 200
+
+    assert list(tmp_path.iterdir()) == []
+    assert db_session.query(Imagem).count() == 0
+
+
+def test_released_image_kept_on_rollback(app, client, helpers, db_session, faker, json_headers, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+    user, password = helpers.create_user(db_session, faker)
+    headers = helpers.bearer_header(helpers.login_user(user, password, client, json_headers))
+
+    data = {'profile_img': (io.BytesIO(PNG_BYTES), 'perfil.png')}
+    response = client.post(UPLOAD_PROFILE_IMG, headers=headers, data=data)
+    assert response.status_code == 200
+
+    with app.app_context():
+        nome = Imagem.query.one().nome
+
+        # o arquivo só é apagado depois do commit
+        release_image(nome)
+        assert len(list(tmp_path.iterdir())) == 1
+        db.session.rollback()
+        assert len(list(tmp_path.iterdir())) == 1
+
+        release_image(nome)
+        db.session.commit()
+        assert list(tmp_path.iterdir()) == []
+
+
+def test_stored_image_removed_on_rollback(app, db_session, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+
+    with app.test_request_context():
+        # o arquivo gravado por uma transação desfeita não fica órfão no disco
+        store_image(FileStorage(io.BytesIO(PNG_BYTES)))
+        assert len(list(tmp_path.iterdir())) == 1
+        db.session.rollback()
+        assert list(tmp_path.iterdir()) == []
+
+        # mas continua no disco quando outro registro já o usa
+        nome = store_image(FileStorage(io.BytesIO(PNG_BYTES)))
+        db.session.commit()
+        store_image(FileStorage(io.BytesIO(PNG_BYTES)))
+        db.session.rollback()
+        assert [path.name for path in tmp_path.iterdir()] == [nome]
+
+
+def test_get_image_conditional_and_range(app, client, helpers, db_session, faker, json_headers, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+    user, password = helpers.create_user(db_session, faker)
+    headers = helpers.bearer_header(helpers.login_user(user, password, client, json_headers))
+
+    data = {'profile_img': (io.BytesIO(PNG_BYTES), 'perfil.png')}
+    location = client.post(UPLOAD_PROFILE_IMG, headers=headers, data=data).headers['Location']
+
+    response = client.get(location)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.cache_control.immutable
+    assert response.data == PNG_BYTES
+
+    etag = response.headers['ETag']
+    response = client.get(location, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get(location, headers={'Range': 'bytes=0-7'})
+    assert response.status_code == 206
+    assert response.data == PNG_BYTES[:8]
+
+
+def test_upload_rejects_unknown_format(app, client, helpers, db_session, faker, json_headers, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+    user, password = helpers.create_user(db_session, faker)
+    headers = helpers.bearer_header(helpers.login_user(user, password, client, json_headers))
+
+    data = {'profile_img': (io.BytesIO(b'isto nao e uma imagem'), 'perfil.png')}
+    response = client.post(UPLOAD_PROFILE_IMG, headers=headers, data=data)
+
+    assert response.status_code == 415
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_rejects_large_image(app, client, helpers, db_session, faker, json_headers, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+    app.config['IMAGE_MAX_SIZE'] = len(PNG_BYTES)
+    user, password = helpers.create_user(db_session, faker)
+    headers = helpers.bearer_header(helpers.login_user(user, password, client, json_headers))
+
+    data = {'profile_img': (io.BytesIO(PNG_BYTES * 2), 'perfil.png')}
+    response = client.post(UPLOAD_PROFILE_IMG, headers=headers, data=data)
+
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_rejects_body_over_max_content_length(app, client, helpers, db_session, faker, json_headers, tmp_path):
+    app.config['IMAGE_PATH'] = str(tmp_path)
+    user, password = helpers.create_user(db_session, faker)
+    headers = helpers.bearer_header(helpers.login_user(user, password, client, json_headers))
+
+    assert app.config['MAX_CONTENT_LENGTH'] == app.config['IMAGE_MAX_SIZE'] + 64 * 1024
+
+    # o corpo é recusado pelo tamanho declarado, antes de ser lido
+    body = b'\x00' * (app.config['MAX_CONTENT_LENGTH'] + 1)
+    response = client.post(UPLOAD_PROFILE_IMG, headers=headers, data=body, content_type='multipart/form-data; boundary=limite')
+
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
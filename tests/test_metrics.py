@@ -0,0 +1,47 @@
+from main.warmup import warm_up
+from conf.config import METRICS, SEARCH_BOOKS
+
+
+def test_metrics_exposition(app, client, json_headers):
+    app.config['METRICS_ENABLED'] = True
+
+    client.post(SEARCH_BOOKS, headers=json_headers, json={})
+    client.post(SEARCH_BOOKS, headers=json_headers, json={'after': 'cursor-invalido'})
+
+    response = client.get(METRICS)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+    lines = response.data.decode().splitlines()
+    samples = {line.rsplit(' ', 1)[0].split('{')[0] + '|' + line.split('{')[1].split('}')[0]: line.rsplit(' ', 1)[1] for line in lines if not line.startswith('#')}
+
+    ok = next(key for key in samples if key.startswith('facilitai_responses_total|') and 'bp.search_books' in key and 'status="200"' in key)
+    bad = next(key for key in samples if key.startswith('facilitai_responses_total|') and 'bp.search_books' in key and 'status="400"' in key)
+    assert samples[ok] == '1'
+    assert samples[bad] == '1'
+
+    count = next(key for key in samples if key.startswith('facilitai_request_duration_seconds_count|') and 'bp.search_books' in key)
+    assert samples[count] == '2'
+
+    queries = next(key for key in samples if key.startswith('facilitai_db_queries_total|') and 'bp.search_books' in key)
+    assert int(samples[queries]) >= 1
+
+
+def test_warm_up_records_startup_and_primes_search_cache(app, client, json_headers):
+    app.config['METRICS_ENABLED'] = True
+
+    timings = warm_up(app)
+    assert {'warmup_pool', 'warmup_auth', 'warmup_search', 'warmup'} <= timings.keys()
+
+    response = client.post(SEARCH_BOOKS, headers=json_headers, json={})
+    assert response.headers['X-Cache'] == 'HIT'
+
+    text = client.get(METRICS).data.decode()
+    assert 'facilitai_startup_seconds{' in text and 'phase="create_app"' in text and 'phase="warmup"' in text
+
+    # os requests do aquecimento não entram nas métricas dos requests
+    assert 'endpoint="bp.search_books_facets"' not in text
+
+
+def test_metrics_disabled_by_default(client):
+    assert client.get(METRICS).status_code == 404
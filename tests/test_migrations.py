@@ -0,0 +1,68 @@
+from sqlalchemy import inspect, select, text
+
+from models.model import db
+from models.migrations import migrate, pending_migrations, schema_version, MIGRATIONS
+from models.search import SEARCH_COLUMNS
+
+
+def test_migrate_adopts_existing_schema(app):
+    latest = [version for version, _, _ in MIGRATIONS]
+
+    with app.app_context():
+        # as tabelas já existem (criadas pelos modelos), mas nenhuma versão foi registrada
+        assert pending_migrations() == latest
+        assert migrate() == latest
+        assert pending_migrations() == []
+        assert migrate() == []
+
+        assert db.session.scalars(select(schema_version.c.version)).all() == latest
+
+
+def test_migrate_command_check(app):
+    runner = app.test_cli_runner()
+
+    assert runner.invoke(args=['migrate', '--check']).exit_code == 1
+    assert runner.invoke(args=['migrate']).exit_code == 0
+    assert runner.invoke(args=['migrate', '--check']).exit_code == 0
+
+
+def test_migrate_upgrades_baseline_schema(app, helpers, db_session, faker):
+    user, _ = helpers.create_user(db_session, faker)
+    ad = helpers.create_book_ad(db_session, {
+        'titulo': 'Livro',
+        'anunciante': user,
+        'descricao': 'Descrição',
+        'preco': 10.0,
+        'titulo_livro': 'Livro',
+        'autor': 'Autor',
+        'genero': 'Ficção',
+        'aceita_trocas': False
+    })
+    trigram_indexes = {f'ix_{column.table.name}_{column.name}_trgm' for columns in SEARCH_COLUMNS.values() for column in columns}
+
+    with app.app_context():
+        # volta ao esquema do baseline, criado pelo antigo create_all na primeira requisição
+        with db.engine.begin() as connection:
+            for table in ('schema_version', 'imagem', 'email_outbox'):
+                connection.execute(text(f'DROP TABLE {table}'))
+
+            connection.execute(text('ALTER TABLE favorites DROP CONSTRAINT uq_favorites_user_anuncio'))
+
+            for index in {'ix_favorites_anuncio_id', 'ix_token_block_list_created_at'} | trigram_indexes:
+                connection.execute(text(f'DROP INDEX {index}'))
+
+            # favoritos repetidos, que o baseline permitia
+            for _ in range(3):
+                connection.execute(text('INSERT INTO favorites (user_id, anuncio_id) VALUES (:user, :ad)'), {'user': user.id, 'ad': ad.id})
+
+        assert migrate() == [version for version, _, _ in MIGRATIONS]
+        assert pending_migrations() == []
+
+        inspector = inspect(db.engine)
+        assert {'schema_version', 'imagem', 'email_outbox'} <= set(inspector.get_table_names())
+        assert 'uq_favorites_user_anuncio' in {constraint['name'] for constraint in inspector.get_unique_constraints('favorites')}
+        assert 'ix_favorites_anuncio_id' in {index['name'] for index in inspector.get_indexes('favorites')}
+        assert 'ix_token_block_list_created_at' in {index['name'] for index in inspector.get_indexes('token_block_list')}
+        assert trigram_indexes <= {index['name'] for table in ('anuncio', 'anuncio_livro', 'anuncio_apartamento') for index in inspector.get_indexes(table)}
+
+        assert db.session.execute(text('SELECT COUNT(*) FROM favorites')).scalar() == 1
@@ -0,0 +1,52 @@
+from models.model import EmailOutbox, StatusEmail
+from models.outbox import EmailWorker
+from models.utils import notify
+from helpers import LocalSMTPServer
+
+
+def test_notify_enqueues_without_sending(app, helpers, db_session, faker):
+    user = helpers.create_user(db_session, faker)[0]
+
+    with app.app_context():
+        assert notify(user) == 'Notification queued'
+
+    email = db_session.query(EmailOutbox).one()
+    assert email.to_email == user.email
+    assert email.status == StatusEmail.PENDENTE.name
+
+
+def test_email_worker_reuses_connection(app, helpers, db_session, faker):
+    user = helpers.create_user(db_session, faker)[0]
+
+    with LocalSMTPServer() as smtp:
+        app.config.update(MAIL_SERVER='localhost', MAIL_PORT=smtp.port, MAIL_USE_SSL=False, MAIL_USERNAME=None)
+
+        with app.app_context():
+            notify(user)
+            notify(user)
+
+            worker = EmailWorker(app)
+            assert worker.send_batch() == 2
+            worker.close()
+
+        assert len(smtp.messages) == 2
+        assert smtp.connections == 1
+
+    statuses = [email.status for email in db_session.query(EmailOutbox).all()]
+    assert statuses == [StatusEmail.ENVIADO.name] * 2
+
+
+def test_email_worker_retries_with_backoff(app, helpers, db_session, faker):
+    user = helpers.create_user(db_session, faker)[0]
+
+    # nenhuma conexão é aceita nessa porta
+    app.config.update(MAIL_SERVER='localhost', MAIL_PORT=1, MAIL_USE_SSL=False, MAIL_USERNAME=None)
+
+    with app.app_context():
+        notify(user)
+        EmailWorker(app).send_batch()
+
+    email = db_session.query(EmailOutbox).one()
+    assert email.status == StatusEmail.PENDENTE.name
+    assert email.attempts == 1
+    assert email.next_attempt_at > email.created_at
@@ -0,0 +1,35 @@
+from sqlalchemy import text
+
+from models.model import db
+from models.pool import max_connections
+from conf.config import POOL_STATS
+
+
+def test_pool_stats(app, client):
+    app.config['POOL_STATS_ENABLED'] = True
+
+    # um checkout explícito, para que a espera por conexão tenha ao menos uma amostra
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+
+    response = client.get(POOL_STATS)
+
+    assert response.status_code == 200
+    assert response.json['pool'] == 'TimedQueuePool'
+    assert response.json['size'] == app.config.get('DB_POOL_SIZE', 5)
+    assert response.json['wait']['count'] >= 1
+    assert {'checked_in', 'checked_out', 'overflow', 'timeouts'} <= response.json.keys()
+
+
+def test_pool_stats_disabled(app, client):
+    app.config['POOL_STATS_ENABLED'] = False
+
+    assert client.get(POOL_STATS).status_code == 404
+
+
+def test_max_connections_budget():
+    config = {'SQLALCHEMY_DATABASE_URI': 'postgresql://usuario@host/facilitai', 'DB_POOL_SIZE': 5, 'DB_MAX_OVERFLOW': 10}
+
+    assert max_connections(config, 4) == 60
+    assert max_connections({**config, 'DB_POOL_MODE': 'pgbouncer'}, 4) is None
@@ -0,0 +1,39 @@
+from sqlalchemy import func
+
+from models.model import db, User, Anuncio, AnuncioLivro, AnuncioApartamento, Favorites, TokenBlockList
+from conf.config import REGISTER
+
+
+def test_seed_data(app, client, json_headers):
+    result = app.test_cli_runner().invoke(args=[
+        'seed-data', '--users', '50', '--books', '300', '--apartments', '100',
+        '--favorites', '500', '--revoked-tokens', '100', '--batch-size', '64'
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert 'anuncio: 400 linhas' in result.output
+
+    with app.app_context():
+        assert db.session.query(func.count(User.id)).scalar() == 50
+        assert db.session.query(func.count(AnuncioLivro.id)).scalar() == 300
+        assert db.session.query(func.count(AnuncioApartamento.id)).scalar() == 100
+        assert db.session.query(func.count(TokenBlockList.id)).scalar() == 100
+
+        pairs = db.session.query(Favorites.user_id, Favorites.anuncio_id).all()
+        assert len(pairs) == len(set(pairs)) == 500
+
+        anuncio = db.session.get(Anuncio, 1)
+        assert isinstance(anuncio, AnuncioLivro)
+        assert anuncio.anunciante is not None
+
+    # as sequências continuam depois dos IDs carregados
+    response = client.post(REGISTER, headers=json_headers, json={
+        'username': 'depois.da.carga',
+        'email': 'depois@carga.com',
+        'matricula': '999999999',
+        'campus': 'CG',
+        'password': '12345678',
+        'curso': 'CC'
+    })
+
+    assert response.status_code == 201
@@ -0,0 +1,19 @@
+from datetime import datetime
+from decimal import Decimal
+
+from models.model import StatusAnuncio
+from main.serialization import StdlibJSONProvider
+
+
+def test_json_provider_custom_types(app):
+    data = {
+        'status': StatusAnuncio.VENDIDO,
+        'criado_em': datetime(2023, 6, 1, 12, 30),
+        'preco': Decimal('10.50')
+    }
+    expected = {'status': 'Vendido', 'criado_em': '2023-06-01T12:30:00', 'preco': '10.50'}
+
+    with app.app_context():
+        assert app.json.loads(app.json.dumps(data)) == expected
+        assert app.json.loads(StdlibJSONProvider(app).dumps(data)) == expected
+        assert app.json.response(data).json == expected